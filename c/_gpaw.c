@@ -97,6 +97,9 @@ PyObject* pblas_rk(PyObject *self, PyObject *args);
 // Moving least squares interpolation
 PyObject* mlsqr(PyObject *self, PyObject *args); 
 
+// Trilinear interpolation
+PyObject* trilinear(PyObject *self, PyObject *args);
+
 // Parallel HDF5
 #ifdef HDF5
 void init_h5py();
@@ -204,6 +207,7 @@ static PyMethodDef functions[] = {
   {"craypat_region_end", craypat_region_end, METH_VARARGS, 0},
 #endif // GPAW_CRAYPAT
   {"mlsqr", mlsqr, METH_VARARGS, 0}, 
+  {"trilinear", trilinear, METH_VARARGS, 0},
 #ifdef HDF5
   {"h5_set_fapl_mpio", set_fapl_mpio, METH_VARARGS, 0}, 
   {"h5_set_dxpl_mpio", set_dxpl_mpio, METH_VARARGS, 0}, 
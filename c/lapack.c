@@ -17,6 +17,8 @@
 #  define dsygv_  dsygv
 #  define dhegv_  dhegv
 #  define zhegv_  zhegv
+#  define dsygvd_ dsygvd
+#  define zhegvd_ zhegvd
 #  define dgeev_  dgeev
 #  define dpotrf_ dpotrf
 #  define dpotri_ dpotri
@@ -66,6 +68,15 @@ void zhegv_(int *itype, char *jobz, char *uplo, int *
 	   double *w, void *work, int *lwork,
 	   double *rwork,
 	   int *lrwork, int *info);
+void dsygvd_(int *itype, char *jobz, char *uplo, int *n,
+	     double *a, int *lda, double *b, int *ldb,
+	     double *w, double *work, int *lwork,
+	     int *iwork, int *liwork, int *info);
+void zhegvd_(int *itype, char *jobz, char *uplo, int *n,
+	     void *a, int *lda, void *b, int *ldb,
+	     double *w, void *work, int *lwork,
+	     double *rwork, int *lrwork,
+	     int *iwork, int *liwork, int *info);
 void dpotrf_(char *uplo, int *n, double *a, int *
 	    lda, int *info);
 void dpotri_(char *uplo, int *n, double *a, int *
@@ -214,27 +225,47 @@ PyObject* general_diagonalize(PyObject *self, PyObject *args)
   int ldb = lda;
   int itype = 1;
   int info = 0;
+  /* Divide and conquer drivers; query the optimal workspace first */
+  int lwork = -1;
+  int liwork = -1;
+  int iwork_size;
   if (a->descr->type_num == PyArray_DOUBLE)
     {
-      int lwork = 3 * n + 1;
+      double work_size;
+      dsygvd_(&itype, "V", "U", &n, DOUBLEP(a), &lda,
+	      DOUBLEP(b), &ldb, DOUBLEP(w),
+	      &work_size, &lwork, &iwork_size, &liwork, &info);
+      lwork = (int)work_size;
+      liwork = iwork_size;
       double* work = GPAW_MALLOC(double, lwork);
-      dsygv_(&itype, "V", "U", &n, DOUBLEP(a), &lda,
-	     DOUBLEP(b), &ldb, DOUBLEP(w),
-	     work, &lwork, &info);
+      int* iwork = GPAW_MALLOC(int, liwork);
+      dsygvd_(&itype, "V", "U", &n, DOUBLEP(a), &lda,
+	      DOUBLEP(b), &ldb, DOUBLEP(w),
+	      work, &lwork, iwork, &liwork, &info);
       free(work);
+      free(iwork);
     }
   else
     {
-      int lwork = 2 * n + 1;
-      int lrwork = 3 * n + 1;
+      double_complex work_size;
+      double rwork_size;
+      int lrwork = -1;
+      zhegvd_(&itype, "V", "U", &n, (void*)COMPLEXP(a), &lda,
+	      (void*)COMPLEXP(b), &ldb, DOUBLEP(w),
+	      (void*)&work_size, &lwork, &rwork_size, &lrwork,
+	      &iwork_size, &liwork, &info);
+      lwork = (int)creal(work_size);
+      lrwork = (int)rwork_size;
+      liwork = iwork_size;
       void* work = GPAW_MALLOC(double_complex, lwork);
       double* rwork = GPAW_MALLOC(double, lrwork);
-      zhegv_(&itype, "V", "U", &n, (void*)COMPLEXP(a), &lda,
-	     (void*)COMPLEXP(b), &lda,
-	     DOUBLEP(w),
-	     work, &lwork, rwork, &lrwork, &info);
+      int* iwork = GPAW_MALLOC(int, liwork);
+      zhegvd_(&itype, "V", "U", &n, (void*)COMPLEXP(a), &lda,
+	      (void*)COMPLEXP(b), &ldb, DOUBLEP(w),
+	      work, &lwork, rwork, &lrwork, iwork, &liwork, &info);
       free(work);
       free(rwork);
+      free(iwork);
     }
   return Py_BuildValue("i", info);
 }
@@ -210,3 +210,89 @@ PyObject* mlsqr(PyObject *self, PyObject *args)
   free(X);
   Py_RETURN_NONE;
 }
+
+
+// Perform a trilinear interpolation to arrays
+// Input arguments:
+// coords: scaled coords [0,1] for interpolation
+// N_c: number of grid points
+// beg_c: first grid point
+// data: the array used
+// target: the results are stored in this array
+PyObject* trilinear(PyObject *self, PyObject *args)
+{
+  PyArrayObject* coords = 0;
+  PyArrayObject* N_c = 0;
+  PyArrayObject* beg_c = 0;
+  PyArrayObject* data;
+  PyArrayObject* target = 0;
+
+  if (!PyArg_ParseTuple(args, "OOOOO", &coords, &N_c, &beg_c, &data, &target))
+    return NULL;
+
+  int points = coords->dimensions[0];
+  const double* coord_nc = DOUBLEP(coords);
+  const double* grid_points = DOUBLEP(N_c);
+  const double* grid_start = DOUBLEP(beg_c);
+  const double* data_g = DOUBLEP(data);
+  double* target_n = DOUBLEP(target);
+
+  int n_c[3] = {data->dimensions[0], data->dimensions[1],
+                data->dimensions[2]};
+  int ldx = n_c[1] * n_c[2];
+  int ldy = n_c[2];
+
+  // Corners may only be wrapped around along directions where the local
+  // array covers the whole period of the grid:
+  int wrap_c[3];
+  for (int c = 0; c < 3; c++)
+    wrap_c[c] = (grid_start[c] == 0.0 && n_c[c] == (int)grid_points[c]);
+
+  for (int p = 0; p < points; p++)
+    {
+      int b_c[3];  // lower corner of the box
+      int B_c[3];  // upper corner of the box
+      double d_c[3];  // coordinates within the box
+      for (int c = 0; c < 3; c++)
+        {
+          double x = (*coord_nc++) * grid_points[c] - grid_start[c];
+          int b = floor(x);
+          int B = ceil(x);
+          d_c[c] = x - b;
+          if (wrap_c[c])
+            {
+              b = safemod(b, n_c[c]);
+              B = safemod(B, n_c[c]);
+            }
+          else if (b < 0 || B >= n_c[c])
+            {
+              PyErr_SetString(PyExc_IndexError,
+                              "trilinear: point outside the local grid");
+              return NULL;
+            }
+          b_c[c] = b;
+          B_c[c] = B;
+        }
+
+      int bx = b_c[0] * ldx;
+      int by = b_c[1] * ldy;
+      int bz = b_c[2];
+      int Bx = B_c[0] * ldx;
+      int By = B_c[1] * ldy;
+      int Bz = B_c[2];
+      double dx = d_c[0];
+      double dy = d_c[1];
+      double dz = d_c[2];
+
+      *target_n++ =
+        data_g[bx + by + bz] * (1.0 - dx) * (1.0 - dy) * (1.0 - dz) +
+        data_g[Bx + by + bz] * dx * (1.0 - dy) * (1.0 - dz) +
+        data_g[bx + By + bz] * (1.0 - dx) * dy * (1.0 - dz) +
+        data_g[Bx + By + bz] * dx * dy * (1.0 - dz) +
+        data_g[bx + by + Bz] * (1.0 - dx) * (1.0 - dy) * dz +
+        data_g[Bx + by + Bz] * dx * (1.0 - dy) * dz +
+        data_g[bx + By + Bz] * (1.0 - dx) * dy * dz +
+        data_g[Bx + By + Bz] * dx * dy * dz;
+    }
+  Py_RETURN_NONE;
+}
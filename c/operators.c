@@ -103,8 +103,26 @@ struct apply_args{
   double* out;
   int real;
   const double_complex* ph;
+  const double* v;
 };
 
+// out += v * in for one band, while it is still in cache.  Used for
+// applying the kinetic energy and local potential in a single sweep.
+static void add_potential(const struct apply_args* args, double* out)
+{
+  const double* in = args->in + (out - args->out);
+  const double* v = args->v;
+  if (args->real)
+    for (int i = 0; i < args->ng; i++)
+      out[i] += in[i] * v[i];
+  else
+    for (int i = 0; i < args->ng / 2; i++)
+      {
+        out[2 * i] += in[2 * i] * v[i];
+        out[2 * i + 1] += in[2 * i + 1] * v[i];
+      }
+}
+
 //Plain worker
 void *apply_worker(void *threadarg)
 {
@@ -144,11 +162,15 @@ void *apply_worker(void *threadarg)
           bc_unpack2(bc, buf, i, recvreq, sendreq, recvbuf, chunksize);
         }
       for (int m = 0; m < chunksize; m++)
-        if (args->real)
-          bmgs_fd(&args->self->stencil, buf + m * args->ng2, out + m * args->ng);
-        else
-          bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2),
-                                         (double_complex*) (out + m * args->ng));
+        {
+          if (args->real)
+            bmgs_fd(&args->self->stencil, buf + m * args->ng2, out + m * args->ng);
+          else
+            bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2),
+                                           (double_complex*) (out + m * args->ng));
+          if (args->v)
+            add_potential(args, out + m * args->ng);
+        }
     }
   free(buf);
   free(recvbuf);
@@ -203,11 +225,15 @@ void *apply_worker_cfd_async(void *threadarg)
                      recvbuf + i * bc->maxrecv * chunksize, chunksize);
         }
       for (int m = 0; m < chunksize; m++)
-        if (args->real)
-          bmgs_fd(&args->self->stencil, buf + m * args->ng2, out + m * args->ng);
-        else
-          bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2),
-                                         (double_complex*) (out + m * args->ng));
+        {
+          if (args->real)
+            bmgs_fd(&args->self->stencil, buf + m * args->ng2, out + m * args->ng);
+          else
+            bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2),
+                                           (double_complex*) (out + m * args->ng));
+          if (args->v)
+            add_potential(args, out + m * args->ng);
+        }
     }
   free(buf);
   free(recvbuf);
@@ -282,12 +308,16 @@ void *apply_worker_cfd(void *threadarg)
                      recvbuf + odd * bc->maxrecv * chunksize + i * bc->maxrecv * chunksize * GPAW_ASYNC2, chunk);
         }
       for (int m = 0; m < chunk; m++)
-        if (args->real)
-          bmgs_fd(&args->self->stencil, buf + m * args->ng2 + odd * args->ng2 * chunksize,
-                                        out + m * args->ng);
-        else
-          bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2 + odd * args->ng2 * chunksize),
-                                         (double_complex*) (out + m * args->ng));
+        {
+          if (args->real)
+            bmgs_fd(&args->self->stencil, buf + m * args->ng2 + odd * args->ng2 * chunksize,
+                                          out + m * args->ng);
+          else
+            bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2 + odd * args->ng2 * chunksize),
+                                           (double_complex*) (out + m * args->ng));
+          if (args->v)
+            add_potential(args, out + m * args->ng);
+        }
       chunk = last_chunk;
     }
 
@@ -300,12 +330,16 @@ void *apply_worker_cfd(void *threadarg)
                  recvbuf + odd * bc->maxrecv * chunksize + i * bc->maxrecv * chunksize * GPAW_ASYNC2, last_chunk);
     }
   for (int m = 0; m < last_chunk; m++)
-    if (args->real)
-      bmgs_fd(&args->self->stencil, buf + m * args->ng2 + odd * args->ng2 * chunksize,
-                                    out + m * args->ng);
-    else
-      bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2 + odd * args->ng2 * chunksize),
-                                     (double_complex*) (out + m * args->ng));
+    {
+      if (args->real)
+        bmgs_fd(&args->self->stencil, buf + m * args->ng2 + odd * args->ng2 * chunksize,
+                                      out + m * args->ng);
+      else
+        bmgs_fdz(&args->self->stencil, (const double_complex*) (buf + m * args->ng2 + odd * args->ng2 * chunksize),
+                                       (double_complex*) (out + m * args->ng));
+      if (args->v)
+        add_potential(args, out + m * args->ng);
+    }
 
   free(buf);
   free(recvbuf);
@@ -319,7 +353,8 @@ static PyObject * Operator_apply(OperatorObject *self,
   PyArrayObject* input;
   PyArrayObject* output;
   PyArrayObject* phases = 0;
-  if (!PyArg_ParseTuple(args, "OO|O", &input, &output, &phases))
+  PyArrayObject* potential = 0;
+  if (!PyArg_ParseTuple(args, "OO|OO", &input, &output, &phases, &potential))
     return NULL;
 
   int nin = 1;
@@ -332,6 +367,24 @@ static PyObject * Operator_apply(OperatorObject *self,
   int ng = bc->ndouble * size1[0] * size1[1] * size1[2];
   int ng2 = bc->ndouble * size2[0] * size2[1] * size2[2];
 
+  // The potential is read directly, so it must be a real contiguous
+  // array with one value per grid point:
+  const double* v = 0;
+  if (potential != 0 && (PyObject*)potential != Py_None)
+    {
+      if (!PyArray_Check(potential) ||
+          potential->descr->type_num != PyArray_DOUBLE ||
+          !PyArray_ISCARRAY_RO(potential) ||
+          PyArray_SIZE(potential) != size1[0] * size1[1] * size1[2])
+        {
+          PyErr_SetString(PyExc_TypeError,
+                          "potential must be a contiguous float array "
+                          "of the same shape as the grid");
+          return NULL;
+        }
+      v = DOUBLEP(potential);
+    }
+
   const double* in = DOUBLEP(input);
   double* out = DOUBLEP(output);
   const double_complex* ph;
@@ -373,6 +426,7 @@ static PyObject * Operator_apply(OperatorObject *self,
       (wargs+i)->out = out;
       (wargs+i)->real = real;
       (wargs+i)->ph = ph;
+      (wargs+i)->v = v;
     }
 #ifndef GPAW_ASYNC
   if (1)
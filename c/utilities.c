@@ -251,6 +251,9 @@ double distance(double *a, double *b)
 /* elementwise multiply and add result to another vector
  *
  * c[i] += a[i] * b[i] ,  for i = every element in the vectors
+ *
+ * b must be real.  If b is shorter than a, it is repeated, so that
+ * c_nG += a_nG * b_G is done in a single pass.  a and c may be complex.
  */
 PyObject* elementwise_multiply_add(PyObject *self, PyObject *args)
 {
@@ -259,16 +262,26 @@ PyObject* elementwise_multiply_add(PyObject *self, PyObject *args)
   PyArrayObject* cc;
   if (!PyArg_ParseTuple(args, "OOO", &aa, &bb, &cc)) 
     return NULL;
-  const double* const a = DOUBLEP(aa);
+  const double* a = DOUBLEP(aa);
   const double* const b = DOUBLEP(bb);
-  double* const c = DOUBLEP(cc);
-  int n = 1;
-  for (int d = 0; d < aa->nd; d++)
-    n *= aa->dimensions[d];
-  for (int i = 0; i < n; i++)
-    {
-      c[i] += a[i] * b[i];
-    }
+  double* c = DOUBLEP(cc);
+  int na = PyArray_SIZE(aa);
+  int nb = PyArray_SIZE(bb);
+  if (PyArray_ISCOMPLEX(aa))
+    for (int j = 0; j < na / nb; j++)
+      for (int i = 0; i < nb; i++)
+        {
+          *c++ += *a++ * b[i];
+          *c++ += *a++ * b[i];
+        }
+  else
+    for (int j = 0; j < na / nb; j++)
+      {
+        for (int i = 0; i < nb; i++)
+          c[i] += a[i] * b[i];
+        a += nb;
+        c += nb;
+      }
   Py_RETURN_NONE;
 }
 
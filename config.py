@@ -5,12 +5,30 @@
 import os
 import sys
 import re
+import shlex
+import threading
 import distutils.util
 from distutils.sysconfig import get_config_var, get_config_vars
 from distutils.command.config import config
+from distutils.spawn import find_executable
 from glob import glob
 from os.path import join
 from stat import ST_MTIME
+try:
+    from subprocess import Popen, PIPE
+except ImportError:
+    Popen = None
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 def check_packages(packages, msg, include_ase, import_numpy):
     """Check the python version and required extra packages
@@ -51,13 +69,8 @@ def check_packages(packages, msg, include_ase, import_numpy):
         if include_ase:
             assert os.path.isdir(ase_root), ase_root+': No such file or directory'
         ase = []
-        for root, dirs, files in os.walk(ase_root):
-            if 'CVS' in dirs:
-                dirs.remove('CVS')
-            if '.svn' in dirs:
-                dirs.remove('.svn')
-            if '__init__.py' in files:
-                ase.append(root.replace('/', '.'))
+        for root in find_packages(ase_root):
+            ase.append(root.replace('/', '.'))
 
         if len(ase) == 0:
             msg += ['* ASE is not installed!  You may be able to install',
@@ -65,6 +78,31 @@ def check_packages(packages, msg, include_ase, import_numpy):
         else:
             packages += ase
 
+def find_packages(root):
+    """Yield directories below root (inclusive) containing __init__.py.
+
+    Each directory is listed exactly once.  With scandir the file type
+    comes from the directory entry itself, so no extra stat() call is
+    needed per entry to tell files and directories apart."""
+    if scandir is None:
+        names = os.listdir(root)
+        subdirs = [name for name in names
+                   if os.path.isdir(join(root, name)) and
+                   not os.path.islink(join(root, name))]
+    else:
+        names = []
+        subdirs = []
+        for entry in scandir(root):
+            names.append(entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+    if '__init__.py' in names:
+        yield root
+    for name in subdirs:
+        if name not in ['CVS', '.svn']:
+            for dir in find_packages(join(root, name)):
+                yield dir
+
 def find_file(arg, dir, files):
     #looks if the first element of the list arg is contained in the list files
     # and if so, appends dir to to arg. To be used with the os.path.walk
@@ -72,6 +110,57 @@ def find_file(arg, dir, files):
         arg.append(dir)
 
 
+def get_stderr(args):
+    """Run command without a shell and return what it wrote to stderr."""
+    if Popen is None:
+        return os.popen3(' '.join(args))[2].read()
+    return Popen(args, stdout=PIPE, stderr=PIPE).communicate()[1]
+
+def probe_sun_cc():
+    """Return (arch, version) of the SUN C compiler.
+
+    Running the compiler is slow, so the result is cached in
+    build/ccprobe.pckl and reused until the compiler itself changes."""
+    cc = find_executable('cc')
+    if cc is None:
+        key = None
+    else:
+        key = (cc, os.stat(cc)[ST_MTIME])
+    cache = 'build/ccprobe.pckl'
+    try:
+        ccprobe = pickle.load(open(cache, 'rb'))
+    except (IOError, EOFError, pickle.UnpicklingError):
+        ccprobe = None
+    if key is not None and ccprobe is not None and ccprobe[0] == key:
+        return ccprobe[1:]
+
+    f = open('cc-test.c', 'w')
+    f.write('int main(){}\n')
+    f.close()
+    arch = re.findall('-xarch=(\S+)', get_stderr(['cc', 'cc-test.c', '-fast']))
+    os.remove('cc-test.c')
+    if len(arch) > 0:
+        arch = arch[-1]
+    else:
+        arch = None
+    cc_version = get_stderr(['cc', '-V']).split('\n')[0].split()[3]
+
+    if key is not None and '--dry-run' not in sys.argv:
+        if not os.path.isdir('build'):
+            os.makedirs('build')
+        pickle.dump((key, arch, cc_version), open(cache, 'wb'), -1)
+    return arch, cc_version
+
+def get_optimization_flags():
+    """Return gcc optimization flags.
+
+    They come after the default flags of distutils on the compile line,
+    so -O3 overrides their -O2.  Set the GPAW_DEBUG environment variable
+    to use only the default flags."""
+    if 'GPAW_DEBUG' in os.environ:
+        return []
+    return ['-O3', '-funroll-loops']
+
 def get_system_config(define_macros, undef_macros,
                       include_dirs, libraries, library_dirs, extra_link_args,
                       extra_compile_args, runtime_library_dirs, extra_objects,
@@ -93,21 +182,16 @@ def get_system_config(define_macros, undef_macros,
 
         extra_compile_args += ['-Kpic', '-fast']
 
+        arch, cc_version = probe_sun_cc()
+
         # Suppress warning from -fast (-xarch=native):
-        f = open('cc-test.c', 'w')
-        f.write('int main(){}\n')
-        f.close()
-        stderr = os.popen3('cc cc-test.c -fast')[2].read()
-        arch = re.findall('-xarch=(\S+)', stderr)
-        os.remove('cc-test.c')
-        if len(arch) > 0:
-            extra_compile_args += ['-xarch=%s' % arch[-1]]
+        if arch is not None:
+            extra_compile_args += ['-xarch=%s' % arch]
 
 
         # We need the -Bstatic before the -lsunperf and -lfsu:
         # http://forum.java.sun.com/thread.jspa?threadID=5072537&messageID=9265782
         extra_link_args += ['-Bstatic', '-lsunperf', '-lfsu', '-Bdynamic']
-        cc_version = os.popen3('cc -V')[2].readline().split()[3]
         if cc_version > '5.6':
             libraries.append('mtsk')
         else:
@@ -140,6 +224,7 @@ def get_system_config(define_macros, undef_macros,
         #
 
         extra_compile_args += ['-Wall', '-std=c99']
+        extra_compile_args += get_optimization_flags()
 
         # Look for ACML libraries:
         acml = glob('/opt/acml*/g*64/lib')
@@ -172,6 +257,7 @@ def get_system_config(define_macros, undef_macros,
         #
 
         extra_compile_args += ['-Wall', '-std=c99']
+        extra_compile_args += get_optimization_flags()
         libraries += ['mkl','mkl_lapack64']
 
     elif machine == 'i686':
@@ -182,6 +268,7 @@ def get_system_config(define_macros, undef_macros,
         #
 
         extra_compile_args += ['-Wall', '-std=c99']
+        extra_compile_args += get_optimization_flags()
 
         if 'MKL_ROOT' in os.environ:
             mklbasedir = [os.environ['MKL_ROOT']]
@@ -269,25 +356,89 @@ def get_scalapack_config(define_macros):
     define_macros.append(('GPAW_WITH_SL', '1'))
 
 
-def mtime(path, name, mtimes):
+# Matches local #include "..." statements:
+_include = re.compile('^#\s*include "(\S+)"', re.MULTILINE)
+
+def mtime(path, name, mtimes, includes=None):
     """Return modification time.
 
     The modification time of a source file is returned.  If one of its
     dependencies is newer, the mtime of that file is returned.
     This function fails if two include files with the same name
-    are present in different directories."""
+    are present in different directories.
 
-    include = re.compile('^#\s*include "(\S+)"', re.MULTILINE)
+    If given, includes is a dictionary mapping file names to
+    (mtime, list of included files) tuples.  A file is only parsed if
+    it is not in the dictionary or if it has been modified since."""
 
-    if mtimes.has_key(name):
+    if name in mtimes:
         return mtimes[name]
-    t = os.stat(os.path.join(path, name))[ST_MTIME]
-    for name2 in include.findall(open(os.path.join(path, name)).read()):
-        path2, name22 = os.path.split(name2)
-        if name22 != name:
-            t = max(t, mtime(os.path.join(path, path2), name22, mtimes))
-    mtimes[name] = t
-    return t
+
+    # Find the file and all its dependencies.  Each file is stat'ed
+    # (and parsed) only once:
+    deps = {}  # name -> (own mtime, names of included files)
+    stack = [(path, name)]
+    while stack:
+        path1, name1 = stack.pop()
+        if name1 in deps or name1 in mtimes:
+            continue
+        filename = os.path.join(path1, name1)
+        t = os.stat(filename)[ST_MTIME]
+        if includes is not None and includes.get(filename, (None,))[0] == t:
+            names = includes[filename][1]
+        else:
+            names = _include.findall(open(filename, 'rb').read())
+            if includes is not None:
+                includes[filename] = (t, names)
+        names1 = []
+        for name2 in names:
+            path2, name22 = os.path.split(name2)
+            # Header names are looked up many times:
+            name22 = intern(name22)
+            if name22 != name1:
+                names1.append(name22)
+                stack.append((os.path.join(path1, path2), name22))
+        deps[name1] = (t, names1)
+
+    # Propagate modification times from the leaves and up:
+    stack = [name]
+    visited = {}
+    while stack:
+        name1 = stack[-1]
+        t, names1 = deps[name1]
+        if name1 not in visited:
+            visited[name1] = True
+            for name2 in names1:
+                if name2 not in mtimes and name2 not in visited:
+                    stack.append(name2)
+        else:
+            stack.pop()
+            if name1 not in mtimes:
+                for name2 in names1:
+                    if name2 in mtimes:
+                        t = max(t, mtimes[name2])
+                mtimes[name1] = t
+    return mtimes[name]
+
+def get_mtimes(top):
+    """Return dictionary of modification times of all files below top."""
+    mtimes = {}
+    if not os.path.isdir(top):
+        return mtimes
+    if scandir is None:
+        for root, dirs, files in os.walk(top):
+            for name in files:
+                filename = join(root, name)
+                mtimes[filename] = os.stat(filename)[ST_MTIME]
+    else:
+        dirs = [top]
+        while dirs:
+            for entry in scandir(dirs.pop()):
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                else:
+                    mtimes[entry.path] = int(entry.stat().st_mtime)
+    return mtimes
 
 def check_dependencies(sources):
     # Distutils does not do deep dependencies correctly.  We take care of
@@ -295,14 +446,22 @@ def check_dependencies(sources):
     # thing!
     mtimes = {}  # modification times
 
+    # Parsed #include statements from the previous run:
+    depcache = 'build/depcache.pckl'
+    try:
+        includes = pickle.load(open(depcache, 'rb'))
+    except (IOError, EOFError, pickle.UnpicklingError):
+        includes = {}
+
     # Remove object files if any dependencies have changed:
     plat = distutils.util.get_platform() + '-' + sys.version[0:3]
+    omtimes = get_mtimes('build/temp.%s' % plat)  # object files
     remove = False
     for source in sources:
         path, name = os.path.split(source)
-        t = mtime(path + '/', name, mtimes)
+        t = mtime(path + '/', name, mtimes, includes)
         o = 'build/temp.%s/%s.o' % (plat, source[:-2])  # object file
-        if os.path.exists(o) and t > os.stat(o)[ST_MTIME]:
+        if o in omtimes and t > omtimes[o]:
             print 'removing', o
             os.remove(o)
             remove = True
@@ -313,6 +472,11 @@ def check_dependencies(sources):
         # print 'removing', so
         os.remove(so)
 
+    if '--dry-run' not in sys.argv:
+        if not os.path.isdir('build'):
+            os.makedirs('build')
+        pickle.dump(includes, open(depcache, 'wb'), -1)
+
 def test_configuration():
     raise NotImplementedError
 
@@ -350,6 +514,71 @@ def write_configuration(define_macros, include_dirs, libraries, library_dirs,
     out.close()
 
 
+output_lock = threading.Lock()
+
+def get_number_of_cpus():
+    try:
+        return max(1, int(os.sysconf('SC_NPROCESSORS_ONLN')))
+    except (AttributeError, ValueError, OSError):
+        return 1
+
+def run_command(cmd):
+    """Run command without a shell and return its exit status.
+
+    The output of the command is passed on to stdout and stderr.  If the
+    command fails, the command and its error output are also appended
+    to configuration.log."""
+    if Popen is None:
+        return os.system(cmd)
+    try:
+        p = Popen(shlex.split(cmd), stdout=PIPE, stderr=PIPE)
+    except OSError, x:
+        out = ''
+        err = '%s\n' % x
+        error = 127
+    else:
+        out, err = p.communicate()
+        error = p.returncode
+    output_lock.acquire()
+    try:
+        sys.stdout.write(out)
+        sys.stderr.write(err)
+        if error != 0:
+            try:
+                log = open('configuration.log', 'a')
+            except IOError:
+                pass
+            else:
+                log.write('\nFAILED (%d): %s\n%s' % (error, cmd, err))
+                log.close()
+    finally:
+        output_lock.release()
+    return error
+
+def run_commands(cmds, nthreads):
+    """Run commands using nthreads threads.
+
+    Returns list of exit statuses in the same order as cmds."""
+    errors = [None] * len(cmds)
+    todo = range(len(cmds))
+    todo.reverse()
+
+    def run():
+        while True:
+            try:
+                i = todo.pop()
+            except IndexError:
+                return
+            errors[i] = run_command(cmds[i])
+
+    threads = [threading.Thread(target=run)
+               for n in range(min(nthreads, len(cmds)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
 def build_interpreter(define_macros, include_dirs, libraries, library_dirs,
                       extra_link_args, extra_compile_args,
                       runtime_library_dirs, extra_objects,
@@ -463,6 +692,7 @@ def build_interpreter(define_macros, include_dirs, libraries, library_dirs,
                            ]
 
     # Compile the parallel sources
+    cmds = []
     for src in sources:
         obj = 'build/temp.%s/' % plat + src[:-1] + 'o'
         cmd = ('%s %s %s %s -o %s -c %s ' ) % \
@@ -473,8 +703,9 @@ def build_interpreter(define_macros, include_dirs, libraries, library_dirs,
                obj,
                src)
         print cmd
-        if '--dry-run' not in sys.argv:
-            error=os.system(cmd)
+        cmds.append(cmd)
+    if '--dry-run' not in sys.argv:
+        for error in run_commands(cmds, get_number_of_cpus()):
             if error != 0:
                 msg = ['* compiling FAILED!  Only serial version of code will work.']
                 break
@@ -493,7 +724,7 @@ def build_interpreter(define_macros, include_dirs, libraries, library_dirs,
     msg = ['* Building a custom interpreter']
     print cmd
     if '--dry-run' not in sys.argv:
-        error=os.system(cmd)
+        error = run_command(cmd)
         if error != 0:
             msg += ['* linking FAILED!  Only serial version of code will work.']
 
@@ -19,7 +19,7 @@ z = np.linspace(0, L, nz, endpoint=False)
 efermi = calc.get_fermi_level()
 
 # Calculate xy averaged potential:
-vz = v.mean(axis=0).mean(axis=0)
+vz = v.reshape((nx * ny, nz)).mean(axis=0)
 print 'Work function: %.2f eV' % (vz.max() - efermi)
 
 plt.plot(z, vz, label='xy averaged effective potential')
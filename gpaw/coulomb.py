@@ -1,7 +1,13 @@
+import os
+import warnings
 from math import pi, sqrt
 
 import numpy as np
 from numpy.fft import fftn
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
 
 from ase.units import Hartree
 from gpaw.lfc import LocalizedFunctionsCollection as LFC
@@ -11,6 +17,60 @@ from gpaw.utilities import pack, unpack, packed_index, unpack2
 from gpaw.utilities.tools import construct_reciprocal, tri2full, symmetrize
 from gpaw.utilities.gauss import Gaussian
 from gpaw.utilities.blas import r2k
+from gpaw.mpi import world
+
+
+# Set when the FFTW wisdom file has been read in this process:
+fftw_wisdom_loaded = False
+
+
+def get_fftw_plan(shape, dtype=complex):
+    """Create in-place 3D FFTW plan for complex arrays of given shape.
+
+    Returns None if pyfftw is not installed.  In serial runs the plan
+    uses one thread per core.  If the environment variable
+    GPAW_FFTW_WISDOM names a file, FFTW wisdom is read from it once per
+    process and written back to it by rank 0, so that the (slow) measuring
+    of the best algorithm for a given shape is only done once."""
+    global fftw_wisdom_loaded
+    if pyfftw is None:
+        return None
+    filename = os.environ.get('GPAW_FFTW_WISDOM')
+    if filename and not fftw_wisdom_loaded:
+        fftw_wisdom_loaded = True
+        if os.path.isfile(filename):
+            try:
+                # Wisdom is plain text; the double, single and long double
+                # parts are separated by NUL characters:
+                wisdom = open(filename, 'rb').read().split('\0')
+                pyfftw.import_wisdom(tuple(wisdom))
+            except (IOError, TypeError, ValueError):
+                pass
+    # Use all cores for the transforms, unless they are shared by several
+    # MPI processes:
+    threads = 1
+    if world.size == 1:
+        try:
+            from multiprocessing import cpu_count
+            threads = cpu_count()
+        except (ImportError, NotImplementedError):
+            pass
+    a = pyfftw.empty_aligned(tuple(shape), dtype)
+    plan = pyfftw.FFTW(a, a, axes=(0, 1, 2),
+                       flags=('FFTW_MEASURE', 'FFTW_DESTROY_INPUT'),
+                       threads=threads)
+    if filename and world.rank == 0:
+        # Write to a temporary file and rename it, so that a reader never
+        # sees a partly written file:
+        tmpname = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            f = open(tmpname, 'wb')
+            f.write('\0'.join(pyfftw.export_wisdom()))
+            f.close()
+            os.rename(tmpname, filename)
+        except (IOError, OSError):
+            pass
+    return plan
 
 
 def get_vxc(paw, spin=0, U=None):
@@ -37,25 +97,50 @@ def get_vxc(paw, spin=0, U=None):
     tri2full(Vxc_nn, 'L') # Fill in upper triangle from lower
     gd.comm.sum(Vxc_nn)
 
-    # Add atomic PAW corrections
+    # Add atomic PAW corrections.  The contributions from all atoms are
+    # stacked along the projector index and added with a single gemm:
+    P_nI = []
+    HP_In = []
     for a, P_ni in paw.wfs.kpt_u[spin].P_ani.items():
         D_sp = paw.density.D_asp[a][:]
         H_sp = np.zeros_like(D_sp)
         paw.wfs.setups[a].xc_correction.calculate_energy_and_derivatives(
             D_sp, H_sp)
         H_ii = unpack(H_sp[spin])
-        Vxc_nn += np.dot(P_ni, np.dot(H_ii, P_ni.T))
+        P_nI.append(P_ni)
+        HP_In.append(np.dot(H_ii, P_ni.T))
+    if len(P_nI) > 0:
+        Vxc_nn += np.dot(np.concatenate(P_nI, axis=1),
+                         np.concatenate(HP_In))
     return Vxc_nn * Hartree
 
 
 class Coulomb:
     """Class used to evaluate two index coulomb integrals."""
-    def __init__(self, gd, poisson=None):
+    def __init__(self, gd, poisson=None, precision='double'):
         """Class should be initialized with a grid_descriptor 'gd' from
            the gpaw module.
+
+           With precision='single', the FFT based methods transform
+           single precision arrays with pyfftw.  The result is then only
+           accurate to about 1e-7 relative.
+           numpy's FFT always works in double precision, so without pyfftw
+           double precision is used (with a warning).
         """
+        assert precision in ('double', 'single')
+        if precision == 'single' and pyfftw is None:
+            warnings.warn('Single precision Coulomb integrals need pyfftw; '
+                          'using double precision', RuntimeWarning)
+            precision = 'double'
         self.gd = gd
         self.poisson = poisson
+        self.precision = precision
+        if precision == 'double':
+            self.real_dtype = float
+            self.complex_dtype = complex
+        else:
+            self.real_dtype = np.float32
+            self.complex_dtype = np.complex64
 
     def load(self, method):
         """Make sure all necessary attributes have been initialized"""
@@ -69,6 +154,10 @@ class Coulomb:
                 raise RuntimeError("Cannot do parallel FFT, use method='real'")
             if not hasattr(self, 'k2'):
                 self.k2, self.N3 = construct_reciprocal(self.gd)
+                # Coulomb kernel in k-space including FFT normalization:
+                self.kernel = (4 * pi / (self.k2 * self.N3)).astype(
+                    self.real_dtype)
+                self.fftw = get_fftw_plan(self.gd.n_c, self.complex_dtype)
             if method.endswith('ewald') and not hasattr(self, 'ewald'):
                 # cutoff radius
                 assert self.gd.orthogonal
@@ -78,10 +167,15 @@ class Coulomb:
                               np.cos(np.sqrt(self.k2) * rc))
                 # lim k -> 0 ewald / k2
                 self.ewald[0, 0, 0] = 0.5 * rc**2
+                self.ewald_kernel = (self.ewald * self.kernel).astype(
+                    self.real_dtype)
             elif method.endswith('gauss') and not hasattr(self, 'ng'):
                 gauss = Gaussian(self.gd)
-                self.ng = gauss.get_gauss(0) / sqrt(4 * pi)
-                self.vg = gauss.get_gauss_pot(0) / sqrt(4 * pi)
+                ng = gauss.get_gauss(0) / sqrt(4 * pi)
+                vg = gauss.get_gauss_pot(0) / sqrt(4 * pi)
+                self.ng = ng.astype(self.real_dtype)
+                self.vg = vg.astype(self.real_dtype)
+                self.ngvg = (ng * vg).astype(self.real_dtype)
         else: # method == 'real'
             if not hasattr(self, 'solve'):
                 if self.poisson is not None:
@@ -92,6 +186,21 @@ class Coulomb:
                     solver.initialize(load_gauss=True)
                     self.solve = solver.solve
 
+    def fft(self, n, Z=None):
+        """Fourier transform of n - Z * ng.
+
+        If a FFTW plan is available, the returned array is the plan's
+        work buffer, which is overwritten by the next call."""
+        if self.fftw is None:
+            if Z is None:
+                return fftn(n)
+            return fftn(n - Z * self.ng)
+        a = self.fftw.input_array
+        a[:] = n
+        if Z is not None:
+            a -= Z * self.ng
+        return self.fftw()
+
     def coulomb(self, n1, n2=None, Z1=None, Z2=None, method='recip_gauss'):
         """Evaluates the coulomb integral of n1 and n2
 
@@ -127,42 +236,56 @@ class Coulomb:
            k-space using FFT techniques.
         """
         self.load(method)
+        real = n1.dtype == float and (n2 is None or n2.dtype == float)
+
         # determine integrand using specified method
         if method == 'real':
             I = self.gd.zeros()
-            if n2 == None: n2 = n1; Z2 = Z1
+            if n2 is None: n2 = n1; Z2 = Z1
             self.solve(I, n2, charge=Z2, eps=1e-12, zero_initial_phi=True)
-            I *= n1.conj()
+            # Integrate n1^* I without forming the product:
+            integral = self.gd.comm.sum(
+                self.gd.integrate(n1, I, global_integral=False))
         elif method == 'recip_ewald':
-            n1k = fftn(n1)
-            if n2 == None: n2k = n1k
-            else: n2k = fftn(n2)
-            I = n1k.conj() * n2k * self.ewald * 4 * pi / (self.k2 * self.N3)
+            n1k = self.fft(n1)
+            I = n1k.conj()
+            if n2 is None: I *= n1k
+            else: I *= self.fft(n2)
+            I *= self.ewald_kernel
         else: # method == 'recip_gauss':
             # Determine total charges
-            if Z1 == None: Z1 = self.gd.integrate(n1)
-            if Z2 == None and n2 != None: Z2 = self.gd.integrate(n2)
+            if Z1 is None: Z1 = self.gd.integrate(n1)
+            if Z2 is None and n2 is not None: Z2 = self.gd.integrate(n2)
 
             # Determine the integrand of the neutral system
             # (n1 - Z1 ng)* int dr'  (n2 - Z2 ng) / |r - r'|
-            nk1 = fftn(n1 - Z1 * self.ng)
-            if n2 == None:
-                I = abs(nk1)**2 * 4 * pi / (self.k2 * self.N3)
+            nk1 = self.fft(n1, Z1)
+            if n2 is None:
+                I = np.absolute(nk1)
+                I *= I
             else:
-                nk2 = fftn(n2 - Z2 * self.ng)
-                I = nk1.conj() * nk2 * 4 * pi / (self.k2 * self.N3)
+                I = nk1.conj()
+                I *= self.fft(n2, Z2)
+            I *= self.kernel
 
             # add the corrections to the integrand due to neutralization
-            if n2 == None:
-                I += (2 * np.real(np.conj(Z1) * n1) -
-                      abs(Z1)**2 * self.ng) * self.vg
+            if n2 is None:
+                if real:
+                    I += (2 * np.real(Z1)) * n1 * self.vg
+                else:
+                    I += 2 * np.real(np.conj(Z1) * n1) * self.vg
+                I -= abs(Z1)**2 * self.ngvg
             else:
-                I += (np.conj(Z1) * n2 + Z2 * n1.conj() -
-                      np.conj(Z1) * Z2 * self.ng) * self.vg
-        if n1.dtype == float and (n2 == None or n2.dtype == float):
-            return np.real(self.gd.integrate(I))
+                I += (np.conj(Z1) * n2 + Z2 * n1.conj()) * self.vg
+                I -= np.conj(Z1) * Z2 * self.ngvg
+        if method != 'real':
+            # Sum up the integrand in double precision
+            integral = self.gd.integrate(
+                np.asarray(I, np.result_type(I, float)))
+        if real:
+            return np.real(integral)
         else:
-            return self.gd.integrate(I)
+            return integral
 
 
 class CoulombNEW:
@@ -295,20 +418,19 @@ class HF:
             # --  ii  iiii  ii
             setup = paw.wfs.setups[a]
             D_p = paw.density.D_asp[a][kpt.s]
-            H_p = np.zeros_like(D_p)
             D_ii = unpack2(D_p)
             ni = len(D_ii)
-            for i1 in range(ni):
-                for i2 in range(ni):
-                    A = 0.0
-                    for i3 in range(ni):
-                        p13 = packed_index(i1, i3, ni)
-                        for i4 in range(ni):
-                            p24 = packed_index(i2, i4, ni)
-                            A += setup.M_pp[p13, p24] * D_ii[i3, i4]
-                    p12 = packed_index(i1, i2, ni)
-                    H_p[p12] -= 2 / deg * A / ((i1 != i2) + 1)
-            H_nn += np.dot(P_ni, np.inner(unpack(H_p), P_ni.conj()))
+
+            # A_ii[i1, i2] = sum_i3i4 M_pp[p13, p24] D_ii[i3, i4]
+            # evaluated as a single matrix-vector product:
+            p_ii = np.array([[packed_index(i1, i2, ni) for i2 in range(ni)]
+                             for i1 in range(ni)])
+            M_iiii = setup.M_pp[p_ii[:, np.newaxis, :, np.newaxis],
+                                p_ii[np.newaxis, :, np.newaxis, :]]
+            A_ii = np.dot(M_iiii.reshape((ni**2, ni**2)),
+                          D_ii.ravel()).reshape((ni, ni))
+            H_ii = -(A_ii + A_ii.T) / deg
+            H_nn += np.dot(P_ni, np.inner(H_ii, P_ni.conj()))
 
     def atomic_val_core(self, paw, H_nn, u=0):
         kpt = paw.wfs.kpt_u[u]
@@ -6,7 +6,6 @@ import numpy as np
 from numpy import dot # avoid the dotblas bug!
 
 from gpaw.utilities.blas import axpy, rk, r2k, gemm
-from gpaw.utilities import unpack
 from gpaw.eigensolvers.eigensolver import Eigensolver
 
 
@@ -85,7 +84,7 @@ class CG(Eigensolver):
                 phi_old_G[:] = phi_G[:]
                 
                 # Calculate projections
-                P2_ai = wfs.pt.dict()
+                P2_ai = self.get_projection_buffers(wfs)
                 wfs.pt.integrate(phi_G, P2_ai, kpt.q)
 
                 # Orthonormalize phi_G to all bands
@@ -115,13 +114,12 @@ class CG(Eigensolver):
                     
                 #find optimum linear combination of psit_G and phi_G
                 an = kpt.eps_n[n]
-                wfs.kin.apply(phi_G, Htphi_G, kpt.phase_cd)
-                Htphi_G += phi_G * vt_G
+                wfs.kin.apply(phi_G, Htphi_G, kpt.phase_cd, vt_G)
                 b = np.vdot(phi_G, Htpsit_G) * self.gd.dv
                 c = np.vdot(phi_G, Htphi_G) * self.gd.dv
                 for a, P2_i in P2_ai.items():
                     P_i = kpt.P_ani[a][n]
-                    dH_ii = unpack(hamiltonian.dH_asp[a][kpt.s])
+                    dH_ii = self.get_dH_ii(hamiltonian, a, kpt.s)
                     b += dot(P2_i, dot(dH_ii, P_i.conj()))
                     c += dot(P2_i, dot(dH_ii, P2_i.conj()))
                 b = self.gd.comm.sum(b.real)
@@ -158,7 +156,7 @@ class CG(Eigensolver):
                     for a, coef_i in coef_ai.items():
                         P_i = kpt.P_ani[a][n]
                         dO_ii = wfs.setups[a].dO_ii
-                        dH_ii = unpack(hamiltonian.dH_asp[a][kpt.s])
+                        dH_ii = self.get_dH_ii(hamiltonian, a, kpt.s)
                         coef_i[:] = (dot(P_i, dH_ii) -
                                      dot(P_i * kpt.eps_n[n], dO_ii))
                     wfs.pt.add(R_G, coef_ai, kpt.q)
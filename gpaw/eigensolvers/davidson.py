@@ -4,7 +4,6 @@ import numpy as np
 
 from gpaw.utilities.blas import axpy, rk, r2k, gemm
 from gpaw.utilities.lapack import diagonalize, general_diagonalize
-from gpaw.utilities import unpack
 from gpaw.eigensolvers.eigensolver import Eigensolver
 
 
@@ -86,19 +85,19 @@ class Davidson(Eigensolver):
                 psit2_nG[n] = self.preconditioner(R_nG[n], kpt)
             
             # Calculate projections
-            P2_ani = wfs.pt.dict(nbands)
+            P2_ani = self.get_projection_buffers(wfs, nbands)
             wfs.pt.integrate(psit2_nG, P2_ani, kpt.q)
             
             # Hamiltonian matrix
             # <psi2 | H | psi>
-            wfs.kin.apply(psit2_nG, self.Htpsit_nG, kpt.phase_cd)
-            hamiltonian.apply_local_potential(psit2_nG, self.Htpsit_nG, kpt.s)
+            wfs.apply_pseudo_hamiltonian(kpt, hamiltonian, psit2_nG,
+                                         self.Htpsit_nG)
             gemm(self.gd.dv, kpt.psit_nG, self.Htpsit_nG, 0.0, self.H_nn, 'c')
 
             for a, P_ni in kpt.P_ani.items():
                 P2_ni = P2_ani[a]
-                dH_ii = unpack(hamiltonian.dH_asp[a][kpt.s])
-                self.H_nn += np.dot(P2_ni, np.dot(dH_ii, P_ni.T.conj()))
+                dH_ii = self.get_dH_ii(hamiltonian, a, kpt.s)
+                gemm(1.0, P_ni, np.dot(P2_ni, dH_ii), 1.0, self.H_nn, 'c')
 
             self.gd.comm.sum(self.H_nn, 0)
             H_2n2n[nbands:, :nbands] = self.H_nn
@@ -106,8 +105,8 @@ class Davidson(Eigensolver):
             # <psi2 | H | psi2>
             r2k(0.5 * self.gd.dv, psit2_nG, self.Htpsit_nG, 0.0, self.H_nn)
             for a, P2_ni in P2_ani.items():
-                dH_ii = unpack(hamiltonian.dH_asp[a][kpt.s])
-                self.H_nn += np.dot(P2_ni, np.dot(dH_ii, P2_ni.T.conj()))
+                dH_ii = self.get_dH_ii(hamiltonian, a, kpt.s)
+                gemm(1.0, P2_ni, np.dot(P2_ni, dH_ii), 1.0, self.H_nn, 'c')
 
             self.gd.comm.sum(self.H_nn, 0)
             H_2n2n[nbands:, nbands:] = self.H_nn
@@ -119,7 +118,7 @@ class Davidson(Eigensolver):
             for a, P_ni in kpt.P_ani.items():
                 P2_ni = P2_ani[a]
                 dO_ii = wfs.setups[a].dO_ii
-                self.S_nn += np.dot(P2_ni, np.inner(dO_ii, P_ni.conj()))
+                gemm(1.0, P_ni, np.dot(P2_ni, dO_ii), 1.0, self.S_nn, 'c')
 
             self.gd.comm.sum(self.S_nn, 0)
             S_2n2n[nbands:, :nbands] = self.S_nn
@@ -128,7 +127,7 @@ class Davidson(Eigensolver):
             rk(self.gd.dv, psit2_nG, 0.0, self.S_nn)
             for a, P2_ni in P2_ani.items():
                 dO_ii = wfs.setups[a].dO_ii
-                self.S_nn += np.dot(P2_ni, np.dot(dO_ii, P2_ni.T.conj()))
+                gemm(1.0, P2_ni, np.dot(P2_ni, dO_ii), 1.0, self.S_nn, 'c')
 
             self.gd.comm.sum(self.S_nn, 0)
             S_2n2n[nbands:, nbands:] = self.S_nn
@@ -155,9 +154,8 @@ class Davidson(Eigensolver):
                 gemm(1.0, P2_ni, H_2n2n[:nbands, nbands:], 1.0, P_ni)
 
             if nit < niter - 1 :
-                wfs.kin.apply(kpt.psit_nG, self.Htpsit_nG, kpt.phase_cd)
-                hamiltonian.apply_local_potential(kpt.psit_nG, self.Htpsit_nG,
-                                                  kpt.s)
+                wfs.apply_pseudo_hamiltonian(kpt, hamiltonian, kpt.psit_nG,
+                                             self.Htpsit_nG)
                 R_nG = self.Htpsit_nG
                 self.calculate_residuals(kpt, wfs, hamiltonian, kpt.psit_nG,
                                          kpt.P_ani, kpt.eps_n, R_nG)
@@ -5,7 +5,7 @@ from math import ceil
 import numpy as np
 
 from gpaw.fd_operators import Laplace
-from gpaw.utilities.blas import axpy, r2k, gemm
+from gpaw.utilities.blas import multi_axpy, r2k, gemm
 from gpaw.utilities.tools import apply_subspace_mask
 from gpaw.utilities import unpack
 
@@ -17,6 +17,10 @@ class Eigensolver:
         self.Htpsit_nG = None
         self.error = np.inf
         self.blocksize = blocksize
+        self.dH_asp = None
+        self.dH_asii = {}
+        self.my_atom_indices = None
+        self.P_saxi = {}
         
     def initialize(self, wfs):
         self.timer = wfs.timer
@@ -76,22 +80,64 @@ class Eigensolver:
         """Implemented in subclasses."""
         raise NotImplementedError
 
+    def get_dH_ii(self, hamiltonian, a, s):
+        """Unpacked atomic Hamiltonian matrix of atom a and spin s.
+
+        The unpacked matrices only depend on spin, so they are cached and
+        reused for all k-points until hamiltonian.dH_asp is updated."""
+        dH_sii = self.get_atomic_cache(hamiltonian, a)[0]
+        if dH_sii[s] is None:
+            dH_sii[s] = unpack(hamiltonian.dH_asp[a][s])
+        return dH_sii[s]
+
+    def get_dHdO_ij(self, hamiltonian, a, s):
+        """The ni x 2ni matrix [dH_ii, dO_ii] of atom a and spin s."""
+        dHdO_sij = self.get_atomic_cache(hamiltonian, a)[1]
+        if dHdO_sij[s] is None:
+            dHdO_sij[s] = np.hstack((self.get_dH_ii(hamiltonian, a, s),
+                                     hamiltonian.setups[a].dO_ii))
+        return dHdO_sij[s]
+
+    def get_atomic_cache(self, hamiltonian, a):
+        if hamiltonian.dH_asp is not self.dH_asp:
+            self.dH_asp = hamiltonian.dH_asp
+            self.dH_asii = {}
+        dH_sp = self.dH_asp[a]
+        if a not in self.dH_asii or self.dH_asii[a][0] is not dH_sp:
+            nspins = len(dH_sp)
+            self.dH_asii[a] = (dH_sp, [None] * nspins, [None] * nspins)
+        return self.dH_asii[a][1:]
+
+    def get_projection_buffers(self, wfs, shape=()):
+        """Work arrays for projections as returned by wfs.pt.dict(shape).
+
+        The arrays are reused between calls until the atoms are
+        redistributed, so their contents are only valid until the next
+        call with the same shape."""
+        if isinstance(shape, int):
+            shape = (shape,)
+        if wfs.pt.my_atom_indices is not self.my_atom_indices:
+            self.my_atom_indices = wfs.pt.my_atom_indices
+            self.P_saxi = {}
+        if shape not in self.P_saxi:
+            self.P_saxi[shape] = wfs.pt.dict(shape)
+        return self.P_saxi[shape]
+
     def calculate_residuals(self, kpt, wfs, hamiltonian, psit_xG, P_axi, eps_x,
                             R_xG, n_x=None, calculate_change=False):
         """Calculate residual.
 
         From R=Ht*psit calculate R=H*psit-eps*S*psit."""
         
-        for R_G, eps, psit_G in zip(R_xG, eps_x, psit_xG):
-            axpy(-eps, psit_G, R_G)
+        multi_axpy(-eps_x, psit_xG, R_xG)
 
+        # c_xi = P_xi dH_ii - eps_x P_xi dO_ii with one matrix product:
         c_axi = {}
         for a, P_xi in P_axi.items():
-            dH_ii = unpack(hamiltonian.dH_asp[a][kpt.s])
-            dO_ii = hamiltonian.setups[a].dO_ii
-            c_xi = (np.dot(P_xi, dH_ii) -
-                    np.dot(P_xi * eps_x[:, np.newaxis], dO_ii))
-            c_axi[a] = c_xi
+            ni = P_xi.shape[1]
+            X_xj = np.dot(P_xi, self.get_dHdO_ij(hamiltonian, a, kpt.s))
+            X_xj[:, ni:] *= eps_x[:, np.newaxis]
+            c_axi[a] = X_xj[:, :ni] - X_xj[:, ni:]
         hamiltonian.xc.add_correction(kpt, psit_xG, R_xG, P_axi, c_axi, n_x,
                                       calculate_change)
         wfs.pt.add(R_xG, c_axi, kpt.q)
@@ -100,7 +146,10 @@ class Eigensolver:
         """Diagonalize the Hamiltonian in the subspace of kpt.psit_nG
 
         *Htpsit_nG* is a work array of same size as psit_nG which contains
-        the local part of the Hamiltonian times psit on exit
+        the local part of the Hamiltonian times psit on exit.  It is only
+        rotated when *keep_htpsit* is True; otherwise H(psit) is written
+        to a temporary buffer of the matrix operator and discarded after
+        the matrix elements have been calculated.
 
         First, the Hamiltonian (defined by *kin*, *vt_sG*, and
         *my_nuclei*) is applied to the wave functions, then the
@@ -134,7 +183,7 @@ class Eigensolver:
             return Htpsit_xG
 
         def dH(a, P_ni):
-            return np.dot(P_ni, unpack(hamiltonian.dH_asp[a][kpt.s]))
+            return np.dot(P_ni, self.get_dH_ii(hamiltonian, a, kpt.s))
 
         self.timer.start('calc_matrix')
         H_nn = self.operator.calculate_matrix_elements(psit_nG, P_ani,
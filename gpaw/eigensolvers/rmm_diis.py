@@ -38,7 +38,7 @@ class RMM_DIIS(Eigensolver):
 
         B = self.blocksize
         dR_xG = self.gd.empty(B, wfs.dtype)
-        P_axi = wfs.pt.dict(B)
+        P_axi = self.get_projection_buffers(wfs, B)
         error = 0.0
         for n1 in range(0, wfs.bd.mynbands, B):
             n2 = n1 + B
@@ -51,10 +51,10 @@ class RMM_DIIS(Eigensolver):
             n_x = range(n1, n2)
             
             if self.keep_htpsit:
-                R_xG = R_nG[n_x]
+                R_xG = R_nG[n1:n2]
             else:
                 R_xG = self.gd.empty(B, wfs.dtype)
-                psit_xG = kpt.psit_nG[n_x]
+                psit_xG = kpt.psit_nG[n1:n2]
                 wfs.apply_pseudo_hamiltonian(kpt, hamiltonian, psit_xG, R_xG)
                 wfs.pt.integrate(psit_xG, P_axi, kpt.q)
                 self.calculate_residuals(kpt, wfs, hamiltonian, psit_xG,
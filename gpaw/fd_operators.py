@@ -77,8 +77,12 @@ class FDOperator:
     def is_allocated(self):
         return self.allocated
 
-    def apply(self, in_xg, out_xg, phase_cd=None):
-        self.operator.apply(in_xg, out_xg, phase_cd)
+    def apply(self, in_xg, out_xg, phase_cd=None, v_g=None):
+        """Apply operator to in_xg and write result to out_xg.
+
+        If a real potential v_g is given, v_g * in_xg is added to the
+        result in the same sweep over the data."""
+        self.operator.apply(in_xg, out_xg, phase_cd, v_g)
 
     def relax(self, relax_method, f_g, s_g, n, w=None):
         self.operator.relax(relax_method, f_g, s_g, n, w)
@@ -98,7 +102,7 @@ class FDOperator:
 if debug:
     _FDOperator = FDOperator
     class FDOperator(_FDOperator):
-        def apply(self, in_xg, out_xg, phase_cd=None):
+        def apply(self, in_xg, out_xg, phase_cd=None, v_g=None):
             assert in_xg.shape == out_xg.shape
             assert in_xg.shape[-3:] == self.shape
             assert in_xg.flags.contiguous
@@ -108,7 +112,10 @@ if debug:
             assert (self.dtype == float or
                     (phase_cd.dtype == complex and
                      phase_cd.shape == (3, 2)))
-            _FDOperator.apply(self, in_xg, out_xg, phase_cd)
+            assert (v_g is None or
+                    v_g.shape == self.shape and
+                    v_g.flags.contiguous and v_g.dtype == float)
+            _FDOperator.apply(self, in_xg, out_xg, phase_cd, v_g)
 
         def relax(self, relax_method, f_g, s_g, n, w=None):
             assert f_g.shape == self.shape
@@ -169,12 +176,14 @@ class FTLaplace:
         self.d = 6.0 / gd.h_cv[0, 0]**2
         self.npoints = 1000
         
-    def apply(self, in_xg, out_xg, phase_cd=None):
+    def apply(self, in_xg, out_xg, phase_cd=None, v_g=None):
         if in_xg.ndim > 3:
             for in_g, out_g in zip(in_xg, out_xg):
                 out_g[:] = ifftn(fftn(in_g) * self.k2_Q).real
         else:
             out_xg[:] = ifftn(fftn(in_xg) * self.k2_Q).real
+        if v_g is not None:
+            out_xg += in_xg * v_g
 
     def get_diagonal_element(self):
         return self.d
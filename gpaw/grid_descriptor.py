@@ -9,15 +9,15 @@ This module contains classes defining two kinds of grids:
 * Radial grids.
 """
 
+import itertools
 from math import pi, cos, sin, ceil, floor
-from cmath import exp
 
 import numpy as np
 
 import _gpaw
 import gpaw.mpi as mpi
 from gpaw.domain import Domain
-from gpaw.utilities import divrl, mlsqr
+from gpaw.utilities import divrl, mlsqr, trilinear, is_contiguous
 from gpaw.spline import Spline
 
 
@@ -25,8 +25,6 @@ from gpaw.spline import Spline
 assert (-1) % 3 == 2
 assert (np.array([-1]) % 3)[0] == 2
 
-NONBLOCKING = False
-
 class GridDescriptor(Domain):
     """Descriptor-class for uniform 3D grid
 
@@ -129,20 +127,40 @@ class GridDescriptor(Domain):
             
         self.n_c = self.end_c - self.beg_c
 
+        # Slices of the subdomains of all ranks in a global array:
+        be_cp2 = [zip(n_p[:-1] - n_p[0], n_p[1:] - n_p[0])
+                  for n_p in self.n_cp]
+        self.slice_rx = [(Ellipsis, slice(b0, e0), slice(b1, e1),
+                          slice(b2, e2))
+                         for (b0, e0), (b1, e1), (b2, e2)
+                         in itertools.product(*be_cp2)]
+
         self.h_cv = self.cell_cv / self.N_c[:, np.newaxis]
-        self.dv = abs(np.linalg.det(self.cell_cv)) / self.N_c.prod()
+        (a0, a1, a2), (b0, b1, b2), (c0, c1, c2) = self.cell_cv
+        det = (a0 * (b1 * c2 - b2 * c1) - a1 * (b0 * c2 - b2 * c0) +
+               a2 * (b0 * c1 - b1 * c0))
+        self.dv = abs(det) / self.N_c.prod()
+
+        # Everything compared by __eq__:
+        self.key = (self.dv, tuple(self.h_cv.ravel()), tuple(self.N_c),
+                    tuple(self.beg_c), tuple(self.end_c))
+
+        self.orthogonal = not (a1 or a2 or b0 or b2 or c0 or c1)
 
-        self.orthogonal = not (self.cell_cv -
-                               np.diag(self.cell_cv.diagonal())).any()
+        # Norms of reciprocal cell vectors (used by get_boxes()):
+        self.icell_c = (self.icell_cv**2).sum(axis=1)**0.5
 
         # Sanity check for grid spacings:
-        L_c = (np.linalg.inv(self.cell_cv)**2).sum(0)**-0.5
+        L_c = (self.icell_cv**2).sum(1)**-0.5
         h_c = L_c / N_c
         if max(h_c) / min(h_c) > 1.3:
             raise ValueError('Very anisotropic grid spacings: %s' % h_c)
 
         self.use_fixed_bc = False
 
+        # Cache for get_boxes():
+        self.boxes_cache = {}
+
     def get_size_of_global_array(self, pad=False):
         if pad:
             return self.N_c
@@ -150,8 +168,9 @@ class GridDescriptor(Domain):
             return self.N_c - 1 + self.pbc_c
 
     def flat_index(self, G_c):
-        g1, g2, g3 = G_c - self.beg_c
-        return g3 + self.n_c[2] * (g2 + g1 * self.n_c[1])
+        b1, b2, b3 = self.beg_c
+        n1, n2 = self.n_c[1:]
+        return G_c[2] - b3 + n2 * (G_c[1] - b2 + (G_c[0] - b1) * n1)
     
     def get_slice(self):
         return [slice(b - 1 + p, e - 1 + p) for b, e, p in
@@ -238,9 +257,20 @@ class GridDescriptor(Domain):
     
     def get_boxes(self, spos_c, rcut, cut=True):
         """Find boxes enclosing sphere."""
+        key = (tuple(spos_c), rcut, cut, self.use_fixed_bc)
+        boxes = self.boxes_cache.get(key)
+        if boxes is None:
+            boxes = self._get_boxes(spos_c, rcut, cut)
+            if len(self.boxes_cache) > 10000:
+                self.boxes_cache.clear()
+            self.boxes_cache[key] = boxes
+        return [(beg_c.copy(), end_c.copy(), disp.copy())
+                for beg_c, end_c, disp in boxes]
+
+    def _get_boxes(self, spos_c, rcut, cut):
         N_c = self.N_c
         #ncut = rcut / self.h_c
-        ncut = rcut * (self.icell_cv**2).sum(axis=1)**0.5 * self.N_c
+        ncut = rcut * self.icell_c * self.N_c
         npos_c = spos_c * N_c
         beg_c = np.ceil(npos_c - ncut).astype(int)
         end_c = np.ceil(npos_c + ncut).astype(int)
@@ -287,24 +317,19 @@ class GridDescriptor(Domain):
                     range_c[c].append((b1, e1))
                 b = e
         
-        boxes = []
-
-        for b0, e0 in range_c[0]:
-            for b1, e1 in range_c[1]:
-                for b2, e2 in range_c[2]:
-                    b = np.array((b0, b1, b2))
-                    e = np.array((e0, e1, e2))
-                    beg_c = np.array((b0 % N_c[0], b1 % N_c[1], b2 % N_c[2]))
-                    end_c = beg_c + e - b
-                    disp = (b - beg_c) / N_c
-                    beg_c = np.maximum(beg_c, self.beg_c)
-                    end_c = np.minimum(end_c, self.end_c)
-                    if (beg_c[0] < end_c[0] and
-                        beg_c[1] < end_c[1] and
-                        beg_c[2] < end_c[2]):
-                        boxes.append((beg_c, end_c, disp))
-
-        return boxes
+        # Enumerate all combinations of the ranges along the three axes:
+        r_cx2 = [np.array(range_c[c], int).reshape((-1, 2)) for c in range(3)]
+        i_cb = np.indices([len(r_x2) for r_x2 in r_cx2]).reshape((3, -1))
+        b_bc = np.array([r_cx2[c][i_cb[c], 0] for c in range(3)]).T
+        e_bc = np.array([r_cx2[c][i_cb[c], 1] for c in range(3)]).T
+
+        beg_bc = b_bc % N_c
+        end_bc = beg_bc + e_bc - b_bc
+        disp_bc = (b_bc - beg_bc) / N_c
+        beg_bc = np.maximum(beg_bc, self.beg_c)
+        end_bc = np.minimum(end_bc, self.end_c)
+        ok_b = (beg_bc < end_bc).all(axis=1)
+        return zip(beg_bc[ok_b], end_bc[ok_b], disp_bc[ok_b])
 
     def get_nearest_grid_point(self, spos_c, force_to_this_domain=False):
         """Return index of nearest grid point.
@@ -317,10 +342,9 @@ class GridDescriptor(Domain):
         """
         g_c = np.around(self.N_c * spos_c).astype(int)
         if force_to_this_domain:
-            for c in range(3):
-                g_c[c] = max(g_c[c], self.beg_c[c])
-                g_c[c] = min(g_c[c], self.end_c[c] - 1)
-        return g_c - self.beg_c
+            np.clip(g_c, self.beg_c, self.end_c - 1, g_c)
+        g_c -= self.beg_c
+        return g_c
 
 
     def symmetrize(self, a_g, op_scc):
@@ -359,21 +383,19 @@ class GridDescriptor(Domain):
         # Put the subdomains from the slaves into the big array
         # for the whole domain:
         A_xg = self.empty(xshape, a_xg.dtype, global_array=True)
-        parsize_c = self.parsize_c
-        r = 0
-        for n0 in range(parsize_c[0]):
-            b0, e0 = self.n_cp[0][n0:n0 + 2] - self.beg_c[0]
-            for n1 in range(parsize_c[1]):
-                b1, e1 = self.n_cp[1][n1:n1 + 2] - self.beg_c[1]
-                for n2 in range(parsize_c[2]):
-                    b2, e2 = self.n_cp[2][n2:n2 + 2] - self.beg_c[2]
-                    if r != 0:
-                        a_xg = np.empty(xshape + 
-                                        ((e0 - b0), (e1 - b1), (e2 - b2)),
-                                        a_xg.dtype.char)
-                        self.comm.receive(a_xg, r, 301)
-                    A_xg[..., b0:e0, b1:e1, b2:e2] = a_xg
-                    r += 1
+        requests = []
+        buffers = []
+        for r, slice_x in enumerate(self.slice_rx[1:]):
+            b_xg = A_xg[slice_x]
+            if not is_contiguous(b_xg):
+                # Receive into a temporary buffer and copy afterwards:
+                b_xg = np.empty(b_xg.shape, A_xg.dtype)
+                buffers.append((slice_x, b_xg))
+            requests.append(self.comm.receive(b_xg, r + 1, 301, block=False))
+        A_xg[self.slice_rx[0]] = a_xg
+        self.comm.waitall(requests)
+        for slice_x, b_xg in buffers:
+            A_xg[slice_x] = b_xg
         if broadcast:
             self.comm.broadcast(A_xg, 0)
         return A_xg
@@ -393,28 +415,15 @@ class GridDescriptor(Domain):
             self.comm.receive(b_xg, 0, 42)
             return
         else:
-            parsize_c = self.parsize_c
             requests = []
-            r = 0
-            for n0 in range(parsize_c[0]):
-                b0, e0 = self.n_cp[0][n0:n0 + 2] - self.beg_c[0]
-                for n1 in range(parsize_c[1]):
-                    b1, e1 = self.n_cp[1][n1:n1 + 2] - self.beg_c[1]
-                    for n2 in range(parsize_c[2]):
-                        b2, e2 = self.n_cp[2][n2:n2 + 2] - self.beg_c[2]
-                        if r != 0:
-                            a_xg = B_xg[..., b0:e0, b1:e1, b2:e2].copy()
-                            request = self.comm.send(a_xg, r, 42, NONBLOCKING)
-                            # Remember to store a reference to the
-                            # send buffer (a_xg) so that is isn't
-                            # deallocated:
-                            requests.append((request, a_xg))
-                        else:
-                            b_xg[:] = B_xg[..., b0:e0, b1:e1, b2:e2]
-                        r += 1
-                        
-            for request, a_xg in requests:
-                self.comm.wait(request)
+            for r, slice_x in enumerate(self.slice_rx[1:]):
+                # The request keeps a reference to the send buffer:
+                a_xg = B_xg[slice_x]
+                if not is_contiguous(a_xg):
+                    a_xg = a_xg.copy()
+                requests.append(self.comm.send(a_xg, r + 1, 42, block=False))
+            b_xg[:] = B_xg[self.slice_rx[0]]
+            self.comm.waitall(requests)
         
     def zero_pad(self, a_xg):
         """Pad array with zeros as first element along non-periodic directions.
@@ -426,8 +435,12 @@ class GridDescriptor(Domain):
             return a_xg
 
         npbx, npby, npbz = 1 - self.pbc_c
-        b_xg = np.zeros(a_xg.shape[:-3] + tuple(self.N_c), dtype=a_xg.dtype)
+        b_xg = np.empty(a_xg.shape[:-3] + tuple(self.N_c), dtype=a_xg.dtype)
         b_xg[..., npbx:, npby:, npbz:] = a_xg
+        # Only the padding planes need to be zeroed:
+        b_xg[..., :npbx, :, :] = 0
+        b_xg[..., :, :npby, :] = 0
+        b_xg[..., :, :, :npbz] = 0
         return b_xg
 
     def calculate_dipole_moment(self, rho_g):
@@ -457,35 +470,18 @@ class GridDescriptor(Domain):
 
         ref1: Thygesen et al, Phys. Rev. B 72, 125119 (2005) 
         """
-        same_wave = False
-        if psit_nG is psit_nG1:
-            same_wave = True
-
         if nbands is None:
             nbands = len(psit_nG)
-        
-        def get_slice(c, g, psit_nG):
-            if c == 0:
-                slice_nG = psit_nG[:nbands, g].copy()
-            elif c == 1:
-                slice_nG = psit_nG[:nbands, :, g].copy()
-            else:
-                slice_nG = psit_nG[:nbands, :, :, g].copy()
-            return slice_nG.reshape((nbands, np.prod(slice_nG.shape[1:])))
-        
-        Z_nn = np.zeros((nbands, nbands), complex)
-        for g in range(self.n_c[c]):
-            A_nG = get_slice(c, g, psit_nG)
-                
-            if same_wave:
-                B_nG = A_nG
-            else:
-                B_nG = get_slice(c, g, psit_nG1)
-                
-            e = exp(-2.j * pi * G * (g + self.beg_c[c]) / self.N_c[c])
-            Z_nn += e * np.dot(A_nG.conj(), B_nG.T) * self.dv
-            
-        return Z_nn
+
+        # Apply the phase factors to the bras and contract over all grid
+        # points with a single matrix multiplication:
+        shape = [1, 1, 1, 1]
+        shape[c + 1] = self.n_c[c]
+        g = np.arange(self.beg_c[c], self.end_c[c])
+        e_g = np.exp(-2.j * pi * G * g / self.N_c[c]).reshape(shape)
+        A_nG = (psit_nG[:nbands].conj() * e_g).reshape((nbands, -1))
+        B_nG = psit_nG1[:nbands].reshape((nbands, -1))
+        return np.dot(A_nG, B_nG.T) * self.dv
 
     def bytecount(self, dtype=float):
         """Get the number of bytes used by a grid of specified dtype."""
@@ -493,8 +489,13 @@ class GridDescriptor(Domain):
 
     def get_grid_point_coordinates(self, dtype=float, global_array=False):
         """Construct cartesian coordinates of grid points in the domain."""
-        r_vG = np.dot(np.indices(self.n_c, dtype).T + self.beg_c,
-                      self.h_cv).T.copy()
+        g0, g1, g2 = [np.arange(self.beg_c[c], self.end_c[c]).astype(dtype)
+                      for c in range(3)]
+        r_vG = self.empty(3, np.result_type(dtype, float))
+        for v, (h0, h1, h2) in enumerate(self.h_cv.T):
+            r_vG[v] = g0[:, None, None] * h0
+            r_vG[v] += g1[:, None] * h1
+            r_vG[v] += g2 * h2
         if global_array:
             return self.collect(r_vG, broadcast=True)  # XXX waste!
         else:
@@ -517,44 +518,10 @@ class GridDescriptor(Domain):
         if use_mlsqr:
             mlsqr(3, 2.3, spos_nc, self.N_c, self.beg_c, vt_g, target_n)     
         else:
-            for n, spos_c in enumerate(spos_nc):
-                g_c = self.N_c * spos_c - self.beg_c
-
-                # The begin and end of the array slice
-                bg_c = np.floor(g_c).astype(int)
-                Bg_c = np.ceil(g_c).astype(int)
-
-                # The coordinate within the box (bottom left = 0,
-                # top right = h_c)
-                dg_c = g_c - bg_c
-                Bg_c %= self.N_c
-
-                target_n[n] = (
-                    vt_g[bg_c[0],bg_c[1],bg_c[2]] *
-                    (1.0 - dg_c[0]) * (1.0 - dg_c[1]) * (1.0 - dg_c[2]) + 
-                    vt_g[Bg_c[0],bg_c[1],bg_c[2]] *
-                    (0.0 + dg_c[0]) * (1.0 - dg_c[1]) * (1.0 - dg_c[2]) + 
-                    vt_g[bg_c[0],Bg_c[1],bg_c[2]] *
-                    (1.0 - dg_c[0]) * (0.0 + dg_c[1]) * (1.0 - dg_c[2]) +  
-                    vt_g[Bg_c[0],Bg_c[1],bg_c[2]] *
-                    (0.0 + dg_c[0]) * (0.0 + dg_c[1]) * (1.0 - dg_c[2]) + 
-                    vt_g[bg_c[0],bg_c[1],Bg_c[2]] *
-                    (1.0 - dg_c[0]) * (1.0 - dg_c[1]) * (0.0 + dg_c[2]) + 
-                    vt_g[Bg_c[0],bg_c[1],Bg_c[2]] *
-                    (0.0 + dg_c[0]) * (1.0 - dg_c[1]) * (0.0 + dg_c[2]) + 
-                    vt_g[bg_c[0],Bg_c[1],Bg_c[2]] *
-                    (1.0 - dg_c[0]) * (0.0 + dg_c[1]) * (0.0 + dg_c[2]) + 
-                    vt_g[Bg_c[0],Bg_c[1],Bg_c[2]] *
-                    (0.0 + dg_c[0]) * (0.0 + dg_c[1]) * (0.0 + dg_c[2]))
+            trilinear(spos_nc, self.N_c, self.beg_c, vt_g, target_n)
 
     def __eq__(self, other):
-        return (self.dv == other.dv and
-                (self.h_cv == other.h_cv).all() and
-                (self.N_c == other.N_c).all() and
-                (self.n_c == other.n_c).all() and
-                (self.beg_c == other.beg_c).all() and
-                (self.end_c == other.end_c).all()
-                )
+        return self.key == other.key
                
 class RadialGridDescriptor:
     """Descriptor-class for radial grid."""
@@ -572,11 +539,13 @@ class RadialGridDescriptor:
         self.r_g = r_g
         self.dr_g = dr_g
         self.dv_g = 4 * pi * r_g**2 * dr_g
+        self.lagrange_xg = None
 
     def derivative(self, n_g, dndr_g):
         """Finite-difference derivative of radial function."""
         dndr_g[0] = n_g[1] - n_g[0]
-        dndr_g[1:-1] = 0.5 * (n_g[2:] - n_g[:-2])
+        np.subtract(n_g[2:], n_g[:-2], dndr_g[1:-1])
+        dndr_g[1:-1] *= 0.5
         dndr_g[-1] = n_g[-1] - n_g[-2]
         dndr_g /= self.dr_g
 
@@ -588,8 +557,8 @@ class RadialGridDescriptor:
         
         c_g = a_g / self.dr_g
         b_g[0] = 0.5 * c_g[1] + c_g[0]
-        b_g[1] = 0.5 * c_g[2] - c_g[0]
-        b_g[1:-1] = 0.5 * (c_g[2:] - c_g[:-2])
+        np.subtract(c_g[2:], c_g[:-2], b_g[1:-1])
+        b_g[1:-1] *= 0.5
         b_g[-2] = c_g[-1] - 0.5 * c_g[-3]
         b_g[-1] = -c_g[-1] - 0.5 * c_g[-2]
 
@@ -620,18 +589,29 @@ class RadialGridDescriptor:
         rmax = r_g[-1]
         r = 1.0 * rmax / points * np.arange(points + 1)
         g = (self.N * r / (self.beta + r) + 0.5).astype(int)
-        g = np.clip(g, 1, ng - 2)
-        r1 = np.take(r_g, g - 1)
-        r2 = np.take(r_g, g)
-        r3 = np.take(r_g, g + 1)
-        x1 = (r - r2) * (r - r3) / (r1 - r2) / (r1 - r3)
-        x2 = (r - r1) * (r - r3) / (r2 - r1) / (r2 - r3)
-        x3 = (r - r1) * (r - r2) / (r3 - r1) / (r3 - r2)
-        f1 = np.take(f_g, g - 1)
-        f2 = np.take(f_g, g)
-        f3 = np.take(f_g, g + 1)
-        f_g = f1 * x1 + f2 * x2 + f3 * x3
-        return f_g
+        np.clip(g, 1, ng - 2, g)
+        g -= 1
+        # Distances to the three grid points are reused by all weights:
+        d1 = r - r_g[g]
+        d2 = r - r_g[g + 1]
+        d3 = r - r_g[g + 2]
+        if self.lagrange_xg is None:
+            # Inverse denominators of the three-point Lagrange weights:
+            a_g = self.r_g[:-2]
+            b_g = self.r_g[1:-1]
+            c_g = self.r_g[2:]
+            self.lagrange_xg = 1.0 / np.array([(a_g - b_g) * (a_g - c_g),
+                                               (b_g - a_g) * (b_g - c_g),
+                                               (c_g - a_g) * (c_g - b_g)])
+        x1 = d2 * d3 * self.lagrange_xg[0, g]
+        x2 = d1 * d3 * self.lagrange_xg[1, g]
+        x3 = d1 * d2 * self.lagrange_xg[2, g]
+        x1 *= f_g[g]
+        x2 *= f_g[g + 1]
+        x3 *= f_g[g + 2]
+        x1 += x2
+        x1 += x3
+        return x1
 
 
 class EquidistantRadialGridDescriptor(RadialGridDescriptor):
@@ -12,6 +12,7 @@ from gpaw.poisson import PoissonSolver
 from gpaw.transformers import Transformer
 from gpaw.lfc import LFC
 from gpaw.utilities import pack2,unpack,unpack2
+from gpaw.utilities import elementwise_multiply_add, is_contiguous
 from gpaw.utilities.tools import tri2full
 
 
@@ -391,7 +392,12 @@ class Hamiltonian:
         
         """
         vt_G = self.vt_sG[s]
-        if psit_nG.ndim == 3:
+        if (is_contiguous(psit_nG) and
+            is_contiguous(Htpsit_nG, psit_nG.dtype) and
+            is_contiguous(vt_G, float)):
+            # Fused multiply-add in a single pass over all bands:
+            elementwise_multiply_add(psit_nG, vt_G, Htpsit_nG)
+        elif psit_nG.ndim == 3:
             Htpsit_nG += psit_nG * vt_G
         else:
             for psit_G, Htpsit_G in zip(psit_nG, Htpsit_nG):
@@ -417,8 +423,7 @@ class Hamiltonian:
         
         """
 
-        wfs.kin.apply(a_xG, b_xG, kpt.phase_cd)
-        self.apply_local_potential(a_xG, b_xG, kpt.s)
+        wfs.kin.apply(a_xG, b_xG, kpt.phase_cd, self.vt_sG[kpt.s])
         shape = a_xG.shape[:-3]
         P_axi = wfs.pt.dict(shape)
 
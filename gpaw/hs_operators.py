@@ -364,8 +364,13 @@ class MatrixOperator:
             # Simple case:
             Apsit_nG = A(psit_nG)
             self._pseudo_braket(psit_nG, Apsit_nG, A_NN)
-            for a, P_ni in P_ani.items():
-                gemm(1.0, P_ni, dA(a, P_ni), 1.0, A_NN, 'c')
+            if P_ani:
+                # Atomic contributions of all atoms with one gemm:
+                P_nI = np.concatenate(P_ani.values(), axis=1)
+                dAP_nI = np.concatenate([dA(a, P_ni)
+                                         for a, P_ni in P_ani.items()],
+                                        axis=1)
+                gemm(1.0, P_nI, dAP_nI, 1.0, A_NN, 'c')
             domain_comm.sum(A_NN, 0)
             return self.bmd.redistribute_output(A_NN)
         
@@ -380,12 +385,15 @@ class MatrixOperator:
             A_qnn = self.A_qnn
 
         # Buffers for send/receive of operated-on versions of P_ani's.
-        sbuf_In = rbuf_In = None
+        # They are stored band-major as (n, I) so that all atoms can be
+        # handled by a single gemm without transposed copies.
+        sbuf_nI = rbuf_nI = None
         if P_ani:
-            sbuf_In = np.concatenate([dA(a, P_ni).T
-                                      for a, P_ni in P_ani.items()])
+            P_nI = np.concatenate(P_ani.values(), axis=1)
+            sbuf_nI = np.concatenate([dA(a, P_ni)
+                                      for a, P_ni in P_ani.items()], axis=1)
             if B > 1:
-                rbuf_In = np.empty_like(sbuf_In)
+                rbuf_nI = np.empty_like(sbuf_nI)
 
         # Because of the amount of communication involved, we need to
         # be syncronized up to this point but only on the 1D band_comm
@@ -415,7 +423,7 @@ class MatrixOperator:
                 # If we're at the last slice, start cycling P_ani too.
                 if q < Q - 1:
                     self._initialize_cycle(sbuf_mG, rbuf_mG,
-                                           sbuf_In, rbuf_In, cycle_P_ani)
+                                           sbuf_nI, rbuf_nI, cycle_P_ani)
 
                 # Calculate pseudo-braket contributions for the current slice
                 # of bands in the current mynbands x mynbands matrix block.
@@ -431,19 +439,14 @@ class MatrixOperator:
 
                 # If we're at the last slice, add contributions from P_ani's.
                 if cycle_P_ani:
-                    I1 = 0
-                    for P_ni in P_ani.values():
-                        I2 = I1 + P_ni.shape[1]
-                        gemm(1.0, P_ni, sbuf_In[I1:I2].T.copy(),
-                             1.0, A_nn, 'c')
-                        I1 = I2
+                    gemm(1.0, P_nI, sbuf_nI, 1.0, A_nn, 'c')
 
                 # Wait for all send/receives to finish before next iteration.
                 # Swap send and receive buffer such that next becomes current.
                 # If we're at the last slice, also finishes the P_ani cycle.
                 if q < Q - 1:
-                    sbuf_mG, rbuf_mG, sbuf_In, rbuf_In = self._finish_cycle(
-                        sbuf_mG, rbuf_mG, sbuf_In, rbuf_In, cycle_P_ani)
+                    sbuf_mG, rbuf_mG, sbuf_nI, rbuf_nI = self._finish_cycle(
+                        sbuf_mG, rbuf_mG, sbuf_nI, rbuf_nI, cycle_P_ani)
 
                 # First iteration was special because we had the ket to ourself
                 if q == 0:
@@ -507,8 +510,15 @@ class MatrixOperator:
             gemm(1.0, psit_nG, C_NN, 0.0, newpsit_nG)
             self.work1_xG = psit_nG
             if P_ani:
+                # Rotate the projections of all atoms with one gemm:
+                P_nI = np.concatenate(P_ani.values(), axis=1)
+                newP_nI = np.empty_like(P_nI)
+                gemm(1.0, P_nI, C_NN, 0.0, newP_nI)
+                I1 = 0
                 for P_ni in P_ani.values():
-                    gemm(1.0, P_ni.copy(), C_NN, 0.0, P_ni)
+                    I2 = I1 + P_ni.shape[1]
+                    P_ni[:] = newP_nI[:, I1:I2]
+                    I1 = I2
             return newpsit_nG
         
         # Now it gets nasty! We parallelize over B groups of bands and
@@ -522,11 +532,13 @@ class MatrixOperator:
         g = int(np.ceil(G / float(J)))
 
         # Buffers for send/receive of pre-multiplication versions of P_ani's.
-        sbuf_In = rbuf_In = None
+        # Stored band-major as (n, I) like in calculate_matrix_elements.
+        sbuf_nI = rbuf_nI = None
         if P_ani:
-            sbuf_In = np.concatenate([P_ni.T for P_ni in P_ani.values()])
+            sbuf_nI = np.concatenate(P_ani.values(), axis=1)
+            newP_nI = np.empty_like(sbuf_nI)
             if B > 1:
-                rbuf_In = np.empty_like(sbuf_In)
+                rbuf_nI = np.empty_like(sbuf_nI)
 
         # Because of the amount of communication involved, we need to
         # be syncronized up to this point but only on the 1D band_comm
@@ -552,7 +564,7 @@ class MatrixOperator:
                 # If we're at the last slice, start cycling P_ani too.
                 if q < Q - 1:
                     self._initialize_cycle(sbuf_ng, rbuf_ng,
-                                           sbuf_In, rbuf_In, cycle_P_ani)
+                                           sbuf_nI, rbuf_nI, cycle_P_ani)
 
                 # Calculate wave-function contributions from the current slice
                 # of grid data by the current mynbands x mynbands matrix block.
@@ -561,23 +573,26 @@ class MatrixOperator:
 
                 # If we're at the last slice, add contributions to P_ani's.
                 if cycle_P_ani:
-                    I1 = 0
-                    for P_ni in P_ani.values():
-                        I2 = I1 + P_ni.shape[1]
-                        gemm(1.0, sbuf_In[I1:I2].T.copy(), C_nn, beta, P_ni)
-                        I1 = I2
+                    gemm(1.0, sbuf_nI, C_nn, beta, newP_nI)
 
                 # Wait for all send/receives to finish before next iteration.
                 # Swap send and receive buffer such that next becomes current.
                 # If we're at the last slice, also finishes the P_ani cycle.
                 if q < Q - 1:
-                    sbuf_ng, rbuf_ng, sbuf_In, rbuf_In = self._finish_cycle(
-                        sbuf_ng, rbuf_ng, sbuf_In, rbuf_In, cycle_P_ani)
+                    sbuf_ng, rbuf_ng, sbuf_nI, rbuf_nI = self._finish_cycle(
+                        sbuf_ng, rbuf_ng, sbuf_nI, rbuf_nI, cycle_P_ani)
 
                 # First iteration was special because we initialized the kets
                 if q == 0:
                     beta = 1.0
 
+        if P_ani:
+            I1 = 0
+            for P_ni in P_ani.values():
+                I2 = I1 + P_ni.shape[1]
+                P_ni[:] = newP_nI[:, I1:I2]
+                I1 = I2
+
         psit_nG.shape = shape
         return psit_nG
 
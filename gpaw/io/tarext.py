@@ -14,29 +14,32 @@ class IncrementalWriter(Writer):
         self.dims[self._iterkey] = 0
         self.dims[self._partkey] = 1
         self.partitions = {}
+        self.partinfo = {}
         self.xml3 = []
 
     def partition(self, name, shape, array=None, dtype=None, units=None):
         if array is not None:
             array = np.asarray(array)
 
-        self.dtype, type, itemsize = self.get_data_type(array, dtype)
-
         assert self._partkey not in shape
         shape = (self._partkey,) + shape
 
-        if name not in self.partitions.keys():
-            self.xml3 += ['  <partition name="%s" type="%s">' % (name, type)]
-            self.xml3 += ['    <dimension length="%s" name="%s"/>' %
-                          (self.dims[dim], dim)
-                          for dim in shape]
-            self.xml3 += ['  </partition>']
+        if name not in self.partitions:
+            self.dtype, type, itemsize = self.get_data_type(array, dtype)
+            self.xml3.append('  <partition name="%s" type="%s">' %
+                             (name, type))
+            self.xml3.extend(['    <dimension length="%s" name="%s"/>' %
+                              (self.dims[dim], dim) for dim in shape])
+            self.xml3.append('  </partition>')
             self.partitions[name] = shape
             self.shape = [self.dims[dim] for dim in shape]
+            size = itemsize * np.product(self.shape)
+            self.partinfo[name] = (self.dtype, size)
         else:
             assert self.partitions[name] == shape
+            # Reuse the data type and size worked out for the first part
+            self.dtype, size = self.partinfo[name]
 
-        size = itemsize * np.product([self.dims[dim] for dim in shape])
         name += self._iterpattern % self.dims[self._iterkey]
         self.write_header(name, size)
         if array is not None:
@@ -82,26 +85,22 @@ class _FakeFileObject(object):
         return self.fileobj.tell() + self.part*self.partsize
 
     def read(self, size=None):
-        self.part, partpos = divmod(self.tell(), self.partsize)
+        partpos = self.fileobj.tell()
+        if size is None:
+            size = (len(self.fileparts) - self.part) * self.partsize - partpos
 
+        # Sweep through the parts from the current position, seeking only
+        # when moving on to the start of the next part
         buf = str()
-        n = self.tell()
-
-        # read some of initial part
-        partrem = min(self.partsize - partpos, size)
-        buf += self.fileobj.read(partrem)
-        n += partrem
-
-        # read whole parts
-        while size - n > self.partsize:
-            self.seek(n)
-            buf += self.fileobj.read(self.partsize)
-            n += self.partsize
-
-        # read some of final part
-        self.seek(n)
-        rem = size - n
-        buf += self.fileobj.read(rem)
+        while True:
+            buf += self.fileobj.read(min(self.partsize - partpos,
+                                         size - len(buf)))
+            if len(buf) == size or self.part + 1 == len(self.fileparts):
+                break
+            self.part += 1
+            self.fileobj = self.fileparts[self.part]
+            self.fileobj.seek(0)
+            partpos = 0
 
         return buf
 
@@ -117,28 +116,52 @@ class IncrementalReader(Reader):
 
     def __init__(self, name):
         self.partitions = {}
+        self.partdims = None
+        self.tarinfos = None
         Reader.__init__(self, name)
         self.dims[self._partkey] = 1
 
     def startElement(self, tag, attrs):
         if tag == 'partition':
             name = attrs['name']
-            assert name not in self.partitions.keys()
+            assert name not in self.partitions
             self.dtypes[name] = attrs['type']
             self.shapes[name] = []
             self.name = name
-            self.partitions[name] = tuple()
+            self.partdims = []
         else:
-            if tag == 'dimension' and self.name in self.partitions.keys():
+            if tag == 'dimension' and self.partdims is not None:
                 if attrs['name'] == self._iterkey:
-                    self.partitions[self.name] += (self._partkey,)
+                    self.partdims.append(self._partkey)
                 else:
-                    self.partitions[self.name] += (attrs['name'],)
+                    self.partdims.append(attrs['name'])
 
             Reader.startElement(self, tag, attrs)
 
+    def endElement(self, tag):
+        if tag == 'partition':
+            self.partitions[self.name] = tuple(self.partdims)
+            self.partdims = None
+
+    def get(self, name, *indices):
+        if name not in self.partitions or len(indices) > 0:
+            return Reader.get(self, name, *indices)
+
+        # Read the parts of a whole partition directly into the array
+        fileobj, shape, size, dtype = self.get_partition_object(name)
+        array = np.empty(shape, dtype)
+        array_px = array.reshape((len(fileobj.fileparts), -1))
+        for array_x, filepart in zip(array_px, fileobj.fileparts):
+            array_x[:] = np.frombuffer(filepart.read(fileobj.partsize), dtype)
+        fileobj.close()
+        if self.byteswap:
+            array = array.byteswap()
+        if dtype == np.int32:
+            array = np.asarray(array, int)
+        return array
+
     def get_file_object(self, name, indices):
-        if name in self.partitions.keys():
+        if name in self.partitions:
             # The first index is the partition iterable
             if len(indices) == 0:
                 return self.get_partition_object(name)
@@ -151,18 +174,18 @@ class IncrementalReader(Reader):
         return Reader.get_file_object(self, name, indices)
 
     def get_data_type(self, name):
-        if name not in self.dtypes.keys():
+        if name not in self.dtypes:
             try:
                 name, partname = name.rsplit('/',1)
             except ValueError:
                 raise KeyError(name)
 
-            assert name in self.partitions.keys()
+            assert name in self.partitions
 
         return Reader.get_data_type(self, name)
 
     def get_partition_object(self, name):
-        assert name in self.partitions.keys()
+        assert name in self.partitions
 
         dtype, type, itemsize = self.get_data_type(name)
         shape = self.shapes[name]
@@ -171,10 +194,16 @@ class IncrementalReader(Reader):
         partshape = [self.dims[dim] for dim in self.partitions[name]]
         partsize = itemsize * np.prod(partshape, dtype=int)
 
+        # Looking up members by name in the tar file is linear in the
+        # number of members, so index them once for all the parts
+        if self.tarinfos is None:
+            self.tarinfos = dict([(tarinfo.name, tarinfo) for tarinfo
+                                  in self.tar.getmembers()])
+
         fileobjs = []
         for i in range(self.dims[self._iterkey]):
-            fileobj = self.tar.extractfile(name + self._iterpattern % i)
-            fileobjs.append(fileobj)
+            tarinfo = self.tarinfos[name + self._iterpattern % i]
+            fileobjs.append(self.tar.extractfile(tarinfo))
 
         return _FakeFileObject(fileobjs, partsize), shape, size, dtype
 
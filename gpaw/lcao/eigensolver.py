@@ -45,12 +45,22 @@ class LCAO:
         wfs.timer.start('Atomic Hamiltonian')
         Mstart = wfs.basis_functions.Mstart
         Mstop = wfs.basis_functions.Mstop
-        for a, P_Mi in kpt.P_aMi.items():
-            dH_ii = np.asarray(unpack(hamiltonian.dH_asp[a][kpt.s]), wfs.dtype)
-            dHP_iM = np.zeros((dH_ii.shape[1], P_Mi.shape[0]), wfs.dtype)
+        # The cheap dH.P products are done atom by atom into one stacked
+        # buffer, so that the expensive update of H_MM is a single gemm
+        # over the projectors of all atoms
+        if kpt.P_aMi:
+            P_Mi_a = kpt.P_aMi.values()
+            P_MI = np.concatenate(P_Mi_a, axis=1)
             # (ATLAS can't handle uninitialized output array)
-            gemm(1.0, P_Mi, dH_ii, 0.0, dHP_iM, 'c')
-            gemm(1.0, dHP_iM, P_Mi[Mstart:Mstop], 1.0, H_MM)
+            dHP_IM = np.zeros((P_MI.shape[1], P_MI.shape[0]), wfs.dtype)
+            I1 = 0
+            for a, P_Mi in zip(kpt.P_aMi.keys(), P_Mi_a):
+                dH_ii = np.asarray(unpack(hamiltonian.dH_asp[a][kpt.s]),
+                                   wfs.dtype)
+                I2 = I1 + P_Mi.shape[1]
+                gemm(1.0, P_Mi, dH_ii, 0.0, dHP_IM[I1:I2], 'c')
+                I1 = I2
+            gemm(1.0, dHP_IM, P_MI[Mstart:Mstop], 1.0, H_MM)
         wfs.timer.stop('Atomic Hamiltonian')
         wfs.timer.start('Distribute overlap matrix')
         H_MM = wfs.ksl.distribute_overlap_matrix(H_MM, root)
@@ -83,10 +93,20 @@ class LCAO:
         # P_ani are not strictly necessary as required quantities can be
         # evaluated directly using P_aMi.  We should probably get rid
         # of the places in the LCAO code using P_ani directly
-        for a, P_ni in kpt.P_ani.items():
+
+        # One gemm for all atoms, whose columns are then copied out
+        if kpt.P_ani:
+            a_a = kpt.P_ani.keys()
+            P_MI = np.concatenate([kpt.P_aMi[a] for a in a_a], axis=1)
             # ATLAS can't handle uninitialized output array:
-            P_ni.fill(117)
-            gemm(1.0, kpt.P_aMi[a], kpt.C_nM, 0.0, P_ni, 'n')
+            P_nI = np.zeros((len(kpt.C_nM), P_MI.shape[1]), wfs.dtype)
+            gemm(1.0, P_MI, kpt.C_nM, 0.0, P_nI, 'n')
+            I1 = 0
+            for a in a_a:
+                P_ni = kpt.P_ani[a]
+                I2 = I1 + P_ni.shape[1]
+                P_ni[:] = P_nI[:, I1:I2]
+                I1 = I2
         wfs.timer.stop('Calculate projections')
 
     def estimate_memory(self, mem, dtype):
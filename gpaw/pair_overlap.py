@@ -1,5 +1,19 @@
 
 import numpy as np
+try:
+    from scipy.linalg import lu_factor, lu_solve
+except ImportError:
+    def solve_right(a_xx, b_xx):
+        """Solve x.a = b for x."""
+        return np.linalg.solve(a_xx.T, b_xx.T).T
+else:
+    def solve_right(a_xx, b_xx):
+        """Solve x.a = b for x.  The input arrays are destroyed."""
+        # The transposes of C-ordered arrays are Fortran-ordered, so that
+        # LAPACK can factorize and solve in place without any copies
+        lu_piv = lu_factor(a_xx.T, overwrite_a=True, check_finite=False)
+        return lu_solve(lu_piv, b_xx.T, overwrite_b=True,
+                        check_finite=False).T
 
 from ase.units import Bohr
 from gpaw import debug
@@ -19,26 +33,78 @@ class PairOverlap:
         self.gd = gd
         self.setups = setups
         self.ni_a = np.cumsum([0]+[setup.ni for setup in self.setups])
+        self.slice_a = [slice(i1, i2) for i1, i2 in
+                        zip(self.ni_a[:-1].tolist(), self.ni_a[1:].tolist())]
 
     def __len__(self):
         return self.ni_a[-1].item()
 
     def assign_atomic_pair_matrix(self, X_aa, a1, a2, dX_ii):
-        X_aa[self.ni_a[a1]:self.ni_a[a1+1],\
-             self.ni_a[a2]:self.ni_a[a2+1]] = dX_ii
+        X_aa[self.slice_a[a1], self.slice_a[a2]] = dX_ii
 
     def extract_atomic_pair_matrix(self, X_aa, a1, a2):
-        return X_aa[self.ni_a[a1]:self.ni_a[a1+1],\
-                    self.ni_a[a2]:self.ni_a[a2+1]]
+        return X_aa[self.slice_a[a1], self.slice_a[a2]]
 
     def calculate_overlaps(self, spos_ac, lfc1, lfc2=None):
         raise RuntimeError('This is a virtual member function.')
 
+    def get_bounding_boxes(self, box_abx):
+        """Return the corners of the boxes enclosing all boxes of each atom.
+
+        Each box is a tuple starting with its beg_c and end_c corners.
+        Atoms without boxes get an empty bounding box."""
+        beg_ac = np.zeros((len(box_abx), 3), int)
+        end_ac = np.zeros((len(box_abx), 3), int)
+        for a, box_bx in enumerate(box_abx):
+            if box_bx:
+                beg_ac[a] = np.min([box_x[0] for box_x in box_bx], axis=0)
+                end_ac[a] = np.max([box_x[1] for box_x in box_bx], axis=0)
+        return beg_ac, end_ac
+
+    def sum_atomic_pair_matrices(self, X_aa, nz_aa):
+        """Sum X_aa over domains.
+
+        Only the blocks of atom pairs flagged in nz_aa on any domain are
+        communicated, unless most of them are."""
+        if self.gd.comm.size == 1:
+            return
+        self.gd.comm.sum(nz_aa)
+        a1_p, a2_p = np.nonzero(nz_aa)
+        if len(a1_p) == 0:
+            return  # no atoms or no overlaps anywhere
+        if len(a1_p) > 0.5 * nz_aa.size:
+            self.gd.comm.sum(X_aa)
+            return
+
+        X_p = np.concatenate([self.extract_atomic_pair_matrix(X_aa, a1, a2)
+                              .ravel() for a1, a2 in zip(a1_p, a2_p)])
+        self.gd.comm.sum(X_p)
+        p1 = 0
+        for a1, a2 in zip(a1_p, a2_p):
+            X_ii = self.extract_atomic_pair_matrix(X_aa, a1, a2)
+            p2 = p1 + X_ii.size
+            X_ii[:] = X_p[p1:p2].reshape(X_ii.shape)
+            p1 = p2
+
+    def get_overlapping_atoms(self, beg1_c, end1_c, beg2_ac, end2_ac):
+        """Return the indices of the bounding boxes which intersect the
+        one given by beg1_c and end1_c."""
+        return np.flatnonzero((np.maximum(beg1_c, beg2_ac) <
+                               np.minimum(end1_c, end2_ac)).all(axis=1))
+
     def calculate_atomic_pair_overlaps(self, lfs1, lfs2): #XXX Move some code here from above...
         raise RuntimeError('This is a virtual member function.')
 
 class GridPairOverlap(PairOverlap):
+    def __init__(self, gd, setups, overlap_dtype=float):
+        """Overlaps of localized functions integrated on the grid.
 
+        overlap_dtype is the data type of the localized functions in the
+        grid inner products for new LFC's.  np.float32 halves the memory
+        traffic, and the overlaps are then accurate to about 1e-6
+        relative to the largest one."""
+        PairOverlap.__init__(self, gd, setups)
+        self.overlap_dtype = overlap_dtype
 
     def calculate_overlaps(self, spos_ac, lfc1, lfc2=None):
         # CONDITION: The two sets of splines must belong to the same kpoint!
@@ -53,6 +119,7 @@ class GridPairOverlap(PairOverlap):
 
         nproj = len(self)
         X_aa = np.zeros((nproj,nproj), dtype=float) # XXX always float?
+        nz_aa = np.zeros((len(self.setups), len(self.setups)), int)
 
         if debug:
             if world.rank == 0:
@@ -66,21 +133,36 @@ class GridPairOverlap(PairOverlap):
             assert len(lfc2.spline_aj) == len(lfc2.spos_ac) # not distributed
             #assert lfc1.lfs_a.keys() == lfc2.lfs_a.keys() # XXX must they be equal?!?
 
+        # Find the boxes of all atoms once. We assume that all functions
+        # of an atom have the same cut-off:
+        def get_boxes(lfc):
+            return [self.gd.get_boxes(spos_ac[a], spline_j[0].get_cutoff(),
+                                      cut=False) # loop over lfs.box_b instead?
+                    for a, spline_j in enumerate(lfc.spline_aj)]
+
+        box1_abx = get_boxes(lfc1)
+        if lfc2 is lfc1:
+            box2_abx = box1_abx
+        else:
+            box2_abx = get_boxes(lfc2)
+
+        # Only pairs of atoms with intersecting bounding boxes can overlap
+        beg1_ac, end1_ac = self.get_bounding_boxes(box1_abx)
+        beg2_ac, end2_ac = self.get_bounding_boxes(box2_abx)
+
         # Both loops are over all atoms in all domains
-        for a1, spline1_j in enumerate(lfc1.spline_aj):
-            # We assume that all functions have the same cut-off:
-            rcut1 = spline1_j[0].get_cutoff()
-            if debug: mpi_debug('a1=%d, spos1_c=%s, rcut1=%g, ni1=%d' % (a1,spos_ac[a1],rcut1,self.setups[a1].ni))
+        for a1, box1_bx in enumerate(box1_abx):
+            if debug: mpi_debug('a1=%d, spos1_c=%s, ni1=%d' % (a1,spos_ac[a1],self.setups[a1].ni))
 
-            for a2, spline2_j in enumerate(lfc2.spline_aj):
-                # We assume that all functions have the same cut-off:
-                rcut2 = spline2_j[0].get_cutoff()
-                if debug: mpi_debug('  a2=%d, spos2_c=%s, rcut2=%g, ni2=%d' % (a2,spos_ac[a2],rcut2,self.setups[a2].ni))
+            for a2 in self.get_overlapping_atoms(beg1_ac[a1], end1_ac[a1],
+                                                 beg2_ac, end2_ac):
+                if debug: mpi_debug('  a2=%d, spos2_c=%s, ni2=%d' % (a2,spos_ac[a2],self.setups[a2].ni))
 
                 X_ii = self.extract_atomic_pair_matrix(X_aa, a1, a2)
+                nz_aa[a1, a2] = 1
 
                 b1 = 0
-                for beg1_c, end1_c, sdisp1_c in self.gd.get_boxes(spos_ac[a1], rcut1, cut=False): # loop over lfs1.box_b instead?
+                for beg1_c, end1_c, sdisp1_c in box1_bx:
                     if debug: mpi_debug('    b1=%d, beg1_c=%s, end1_c=%s, sdisp1_c=%s' % (b1,beg1_c,end1_c,sdisp1_c), ordered=False)
 
                     # Atom a1 has at least one piece so the LFC has LocFuncs
@@ -94,7 +176,7 @@ class GridPairOverlap(PairOverlap):
                         assert self.setups[a1].ni == lfs1.ni, 'setups[%d].ni=%d, lfc1.lfs_a[%d].ni=%d' % (a1,self.setups[a1].ni,a1,lfs1.i)
 
                     b2 = 0
-                    for beg2_c, end2_c, sdisp2_c in self.gd.get_boxes(spos_ac[a2], rcut2, cut=False): # loop over lfs2.box_b instead?
+                    for beg2_c, end2_c, sdisp2_c in box2_abx[a2]:
                         if debug: mpi_debug('      b2=%d, beg2_c=%s, end2_c=%s, sdisp2_c=%s' % (b2,beg2_c,end2_c,sdisp2_c), ordered=False)
 
                         # Atom a2 has at least one piece so the LFC has LocFuncs
@@ -133,7 +215,7 @@ class GridPairOverlap(PairOverlap):
 
                     b1 += 1
 
-        self.gd.comm.sum(X_aa) # better to sum over X_ii?
+        self.sum_atomic_pair_matrices(X_aa, nz_aa)
         return X_aa
 
 
@@ -147,6 +229,7 @@ class GridPairOverlap(PairOverlap):
 
         nproj = len(self)
         X_aa = np.zeros((nproj,nproj), dtype=float) # XXX always float?
+        nz_aa = np.zeros((len(self.setups), len(self.setups)), int)
 
         if debug:
             if world.rank == 0:
@@ -159,69 +242,61 @@ class GridPairOverlap(PairOverlap):
         if debug:
             assert len(lfc1.sphere_a) == len(lfc2.sphere_a) # XXX must they be equal?!?
 
-        # Both a-loops are over all relevant atoms which affect this domain
-        for a1 in lfc1.atom_indices:
-            sphere1 = lfc1.sphere_a[a1]
-
-            # We assume that all functions have the same cut-off:
-            spline1_j = sphere1.spline_j
-            rcut1 = spline1_j[0].get_cutoff()
-            if debug: mpi_debug('a1=%d, spos1_c=%s, rcut1=%g, ni1=%d' % (a1,spos_ac[a1],rcut1,self.setups[a1].ni), ordered=False)
-
-            for a2 in lfc2.atom_indices:
-                sphere2 = lfc2.sphere_a[a2]
-
+        # Evaluate the functions of each atom once on each of its boxes
+        def get_boxes_and_functions(lfc):
+            F_abx = {}
+            for a in lfc.atom_indices:
                 # We assume that all functions have the same cut-off:
-                spline2_j = sphere2.spline_j
-                rcut2 = spline2_j[0].get_cutoff()
-                if debug: mpi_debug('  a2=%d, spos2_c=%s, rcut2=%g, ni2=%d' % (a2,spos_ac[a2],rcut2,self.setups[a2].ni), ordered=False)
+                spline_j = lfc.sphere_a[a].spline_j
+                rcut = spline_j[0].get_cutoff()
+                F_abx[a] = []
+                for beg_c, end_c, sdisp_c in self.gd.get_boxes(spos_ac[a],
+                    rcut, cut=False):
+                    F_iB = np.concatenate([spline.get_functions(self.gd,
+                        beg_c, end_c, spos_ac[a] - sdisp_c)
+                        for spline in spline_j])
+                    F_iB = np.asarray(F_iB, self.overlap_dtype)
+                    F_abx[a].append((beg_c, end_c, F_iB))
+            return F_abx
+
+        F1_abx = get_boxes_and_functions(lfc1)
+        if lfc2 is lfc1:
+            F2_abx = F1_abx
+        else:
+            F2_abx = get_boxes_and_functions(lfc2)
 
-                X_ii = self.extract_atomic_pair_matrix(X_aa, a1, a2)
+        # Only pairs of atoms with intersecting bounding boxes can overlap
+        a2_a = F2_abx.keys()
+        F2_abx = [F2_abx[a2] for a2 in a2_a]
+        beg2_ac, end2_ac = self.get_bounding_boxes(F2_abx)
 
-                b1 = 0
-                for beg1_c, end1_c, sdisp1_c in self.gd.get_boxes(spos_ac[a1], rcut1, cut=False): # loop over lfs1.box_b instead?
-                    if debug: mpi_debug('    b1=%d, beg1_c=%s, end1_c=%s, sdisp1_c=%s' % (b1,beg1_c,end1_c,sdisp1_c), ordered=False)
-
-                    b2 = 0
-                    for beg2_c, end2_c, sdisp2_c in self.gd.get_boxes(spos_ac[a2], rcut2, cut=False): # loop over lfs2.box_b instead?
-                        if debug: mpi_debug('      b2=%d, beg2_c=%s, end2_c=%s, sdisp2_c=%s' % (b2,beg2_c,end2_c,sdisp2_c), ordered=False)
+        # Both a-loops are over all relevant atoms which affect this domain
+        for a1, F1_bx in F1_abx.items():
+            beg1_c, end1_c = self.get_bounding_boxes([F1_bx])
+            for i2 in self.get_overlapping_atoms(beg1_c[0], end1_c[0],
+                                                 beg2_ac, end2_ac):
+                a2 = a2_a[i2]
+                F2_bx = F2_abx[i2]
+                X_ii = self.extract_atomic_pair_matrix(X_aa, a1, a2)
+                nz_aa[a1, a2] = 1
 
+                for beg1_c, end1_c, bra_iB in F1_bx:
+                    for beg2_c, end2_c, ket_iB in F2_bx:
                         # Find the intersection of the two boxes
-                        beg_c = np.array([map(max, zip(beg1_c, beg2_c))]).ravel()
-                        end_c = np.array([map(min, zip(end1_c, end2_c))]).ravel()
-
-                        if debug: mpi_debug('        beg_c=%s, end_c=%s, size_c=%s' % (beg_c, end_c, tuple(end_c-beg_c)), ordered=False)
+                        beg_c = np.maximum(beg1_c, beg2_c)
+                        end_c = np.minimum(end1_c, end2_c)
 
                         # Intersection is non-empty, add overlap contribution
                         if (beg_c < end_c).all():
-                            i1 = 0
-                            for j1, spline1 in enumerate(spline1_j):
-                                bra1_mB = spline1.get_functions(self.gd, \
-                                    beg_c, end_c, spos_ac[a1]-sdisp1_c)
-                                nm1 = bra1_mB.shape[0]
-
-                                i2 = 0
-                                for j2, spline2 in enumerate(spline2_j):
-                                    ket2_mB = spline2.get_functions(self.gd, \
-                                        beg_c, end_c, spos_ac[a2]-sdisp2_c)
-                                    nm2 = ket2_mB.shape[0]
-
-                                    X_mm = X_ii[i1:i1+nm1,i2:i2+nm2]
-                                    X_mm += self.gd.dv * np.inner( \
-                                        bra1_mB.reshape((nm1,-1)), \
-                                        ket2_mB.reshape((nm2,-1))) #XXX phase factors for kpoints
-
-                                    del ket2_mB
-                                    i2 += nm2
-
-                                del bra1_mB
-                                i1 += nm1
-
-                        b2 += 1
-
-                    b1 += 1
+                            w1slice = tuple([slice(None)]+[slice(b,e) \
+                                for b,e in zip(beg_c-beg1_c, end_c-beg1_c)])
+                            w2slice = tuple([slice(None)]+[slice(b,e) \
+                                for b,e in zip(beg_c-beg2_c, end_c-beg2_c)])
+                            X_ii += self.gd.dv * np.inner( \
+                                bra_iB[w1slice].reshape((len(bra_iB),-1)), \
+                                ket_iB[w2slice].reshape((len(ket_iB),-1))) #XXX phase factors for kpoints
 
-        self.gd.comm.sum(X_aa) # better to sum over X_ii?
+        self.sum_atomic_pair_matrices(X_aa, nz_aa)
         return X_aa
 
 
@@ -297,6 +372,8 @@ class ProjectorPairOverlap(Overlap, GridPairOverlap):
         self.natoms = len(atoms)
         if debug:
             assert len(self.setups) == self.natoms
+        self.spos_ac = None  # positions for which B_aa was calculated
+        self.cell_cv = None
         self.update(wfs, atoms)
 
     def update(self, wfs, atoms):
@@ -331,7 +408,38 @@ class ProjectorPairOverlap(Overlap, GridPairOverlap):
 
         #spos_ac = wfs.pt.spos_ac # not in NewLFC
         spos_ac = atoms.get_scaled_positions() % 1.0
+        cell_cv = atoms.get_cell()
+
+        # All coefficients below depend only on B_aa, i.e. on the atomic
+        # positions, the cell, the grid and the projectors of the setups.
+        # The grid and the setups are fixed for the lifetime of this
+        # object, so nothing needs to be done if the atoms have not moved:
+        if (self.spos_ac is not None and (spos_ac == self.spos_ac).all() and
+            (cell_cv == self.cell_cv).all()):
+            self.timer.stop('Update two-center overlap')
+            return
+        self.spos_ac = spos_ac
+        self.cell_cv = cell_cv
+
         self.B_aa = self.calculate_overlaps(spos_ac, wfs.pt)
+        B_aa = self.B_aa
+
+        # Find the atoms whose projectors overlap those of each atom, unless
+        # most of them do, in which case B_aa is treated as a dense matrix
+        ni_a = np.diff(self.ni_a)
+        nz_aa = np.zeros((len(ni_a), len(ni_a)), bool)
+        # Atoms without projectors are left out, since reduceat would give
+        # them the block of the next atom instead of an empty sum:
+        a_b = np.flatnonzero(ni_a)
+        if len(a_b) > 0:
+            i_b = self.ni_a[a_b]
+            nz_aa[np.ix_(a_b, a_b)] = np.add.reduceat(np.add.reduceat(
+                np.abs(B_aa), i_b, axis=0), i_b, axis=1) > 0
+        if nz_aa.mean() > 0.5:
+            self.I_aI = None
+        else:
+            self.I_aI = [np.flatnonzero(np.repeat(nz_a, ni_a))
+                         for nz_a in nz_aa]
 
         # Create two-center (block-diagonal) coefficients for overlap operator
         dO_aa = np.zeros((nproj, nproj), dtype=float) #always float?
@@ -344,7 +452,7 @@ class ProjectorPairOverlap(Overlap, GridPairOverlap):
         # Calculate two-center coefficients for inverse overlap operator
         lhs_aa = np.eye(nproj) + self.xO_aa
         rhs_aa = -dO_aa
-        self.dC_aa = np.linalg.solve(lhs_aa.T, rhs_aa.T).T #TODO parallel
+        self.dC_aa = solve_right(lhs_aa, rhs_aa) #TODO parallel
 
         # Calculate two-center rotation matrix for inverse overlap projections
         self.xC_aa = self.get_rotated_coefficients(self.dC_aa)
@@ -363,8 +471,57 @@ class ProjectorPairOverlap(Overlap, GridPairOverlap):
             i1,i3   /       i1    i2     i2,i3
                     ---
                    a2,i2
+
+        Only atoms a2 whose projectors overlap those of a1 contribute, so
+        for sparse systems the sum is restricted to these.
         """
-        return np.dot(self.B_aa, X_aa)
+        if self.I_aI is None:
+            return np.dot(self.B_aa, X_aa)
+
+        Y_aa = np.empty(X_aa.shape, np.result_type(self.B_aa, X_aa))
+        for a1, I_I in enumerate(self.I_aI):
+            Y_aa[self.slice_a[a1]] = np.dot(self.B_aa[self.slice_a[a1], I_I],
+                                            X_aa[I_I])
+        return Y_aa
+
+    def apply_pair_coefficients(self, X_aa, P_axi, Q_axi, shape, dtype,
+                                add_projections=False):
+        """Contract projections with two-center coefficients.
+
+        Performs the following operation for all atoms a1 and stores the
+        result in Q_axi for those atoms which are present there::
+
+                    ---
+             a1     \      a2   a1,a2
+            Q     =  )   P     X
+             x,i1   /     x,i2  i1,i2
+                    ---
+                   a2,i2
+
+        The projections of all local atoms are contracted in a single
+        matrix product and summed over domains with one call. If
+        add_projections is True, P_axi is added to the result as well.
+        """
+        Q_xI = np.zeros(shape + (len(self),), dtype)
+        if P_axi:
+            a_a = sorted(P_axi.keys())
+            P_xI = np.concatenate([P_axi[a] for a in a_a], axis=-1)
+            if len(a_a) == self.natoms:
+                X_aI = X_aa
+                I_I = slice(None)
+            else:
+                I_I = np.concatenate([np.arange(self.ni_a[a],
+                                                self.ni_a[a + 1])
+                                      for a in a_a])
+                X_aI = X_aa[:, I_I]
+            Q_xI += np.dot(P_xI, X_aI.T) #sum over a2 and last i in X_ii
+            if add_projections:
+                Q_xI[..., I_I] += P_xI
+        self.gd.comm.sum(Q_xI)
+
+        for a, Q_xi in Q_axi.items():
+            Q_xi[:] = Q_xI[..., self.slice_a[a]]
+        return Q_axi
 
     def apply_to_atomic_matrices(self, dI_asp, P_axi, wfs, kpt, shape=()):
 
@@ -380,17 +537,9 @@ class ProjectorPairOverlap(Overlap, GridPairOverlap):
         self.gd.comm.sum(dI_aa) #TODO too heavy?
 
         dM_aa = self.get_rotated_coefficients(dI_aa)
-        Q_axi = wfs.pt.dict(shape, zero=True)
-        for a1 in range(self.natoms):
-            if a1 in Q_axi.keys():
-                Q_xi = Q_axi[a1]
-            else:
-                # Atom a1 is not in domain so allocate a temporary buffer
-                Q_xi = np.zeros(shape+(self.setups[a1].ni,), dtype=wfs.pt.dtype) #TODO
-            for a2, P_xi in P_axi.items():
-                dM_ii = self.extract_atomic_pair_matrix(dM_aa, a1, a2)
-                Q_xi += np.dot(P_xi, dM_ii.T) #sum over a2 and last i in dM_ii
-            self.gd.comm.sum(Q_xi)
+        Q_axi = wfs.pt.dict(shape)
+        self.apply_pair_coefficients(dM_aa, P_axi, Q_axi, shape,
+                                     wfs.pt.dtype)
 
         self.timer.stop('Update two-center projections')
 
@@ -438,20 +587,9 @@ class ProjectorPairOverlap(Overlap, GridPairOverlap):
         self.timer.stop('Apply overlap')
 
         if extrapolate_P_ani:
-            for a1 in range(self.natoms):
-                if a1 in Q_axi.keys():
-                    Q_xi = Q_axi[a1]
-                    Q_xi[:] = P_axi[a1]
-                else:
-                    # Atom a1 is not in domain so allocate a temporary buffer
-                    Q_xi = np.zeros(shape+(self.setups[a1].ni,), dtype=wfs.pt.dtype) #TODO
-                for a2, P_xi in P_axi.items():
-                    # xO_aa are the overlap extrapolators across atomic pairs
-                    xO_ii = self.extract_atomic_pair_matrix(self.xO_aa, a1, a2)
-                    Q_xi += np.dot(P_xi, xO_ii.T) #sum over a2 and last i in xO_ii
-                self.gd.comm.sum(Q_xi)
-
-            return Q_axi
+            # xO_aa are the overlap extrapolators across atomic pairs
+            return self.apply_pair_coefficients(self.xO_aa, P_axi, Q_axi,
+                shape, wfs.pt.dtype, add_projections=True)
         else:
             return P_axi
 
@@ -469,37 +607,18 @@ class ProjectorPairOverlap(Overlap, GridPairOverlap):
             for a,P_ni in kpt.P_ani.items():
                 P_axi[a][:] = P_ni
 
-        Q_axi = wfs.pt.dict(shape, zero=True)
-        for a1 in range(self.natoms):
-            if a1 in Q_axi.keys():
-                Q_xi = Q_axi[a1]
-            else:
-                # Atom a1 is not in domain so allocate a temporary buffer
-                Q_xi = np.zeros(shape+(self.setups[a1].ni,), dtype=wfs.pt.dtype) #TODO
-            for a2, P_xi in P_axi.items():
-                # dC_aa are the inverse coefficients across atomic pairs
-                dC_ii = self.extract_atomic_pair_matrix(self.dC_aa, a1, a2)
-                Q_xi += np.dot(P_xi, dC_ii.T) #sum over a2 and last i in dC_ii
-            self.gd.comm.sum(Q_xi)
+        # dC_aa are the inverse coefficients across atomic pairs
+        Q_axi = wfs.pt.dict(shape)
+        self.apply_pair_coefficients(self.dC_aa, P_axi, Q_axi, shape,
+                                     wfs.pt.dtype)
 
         wfs.pt.add(b_xG, Q_axi, kpt.q)
         self.timer.stop('Apply inverse overlap')
 
         if extrapolate_P_ani:
-            for a1 in range(self.natoms):
-                if a1 in Q_axi.keys():
-                    Q_xi = Q_axi[a1]
-                    Q_xi[:] = P_axi[a1]
-                else:
-                    # Atom a1 is not in domain so allocate a temporary buffer
-                    Q_xi = np.zeros(shape+(self.setups[a1].ni,), dtype=wfs.pt.dtype) #TODO
-                for a2, P_xi in P_axi.items():
-                    # xC_aa are the inverse extrapolators across atomic pairs
-                    xC_ii = self.extract_atomic_pair_matrix(self.xC_aa, a1, a2)
-                    Q_xi += np.dot(P_xi, xC_ii.T) #sum over a2 and last i in xC_ii
-                self.gd.comm.sum(Q_xi)
-
-            return Q_axi
+            # xC_aa are the inverse extrapolators across atomic pairs
+            return self.apply_pair_coefficients(self.xC_aa, P_axi, Q_axi,
+                shape, wfs.pt.dtype, add_projections=True)
         else:
             return P_axi
 
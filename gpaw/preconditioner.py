@@ -48,24 +48,25 @@ class Preconditioner:
         d0, q0 = self.scratch0[:,:nb]
         r1, d1, q1 = self.scratch1[:, :nb]
         r2, d2, q2 = self.scratch2[:, :nb]
-        self.restrictor0(-residuals, r1, phases)
-        d1[:] = 4 * step * r1
+        self.restrictor0(residuals, r1, phases)
+        r1 *= -1.0
+        np.multiply(r1, 4 * step, d1)
         self.kin1.apply(d1, q1, phases)
         q1 -= r1
         self.restrictor1(q1, r2, phases)
-        d2 = 16 * step * r2
+        np.multiply(r2, 16 * step, d2)
         self.kin2.apply(d2, q2, phases)
         q2 -= r2
-        d2 -= 16 * step * q2
+        axpy(-16 * step, q2, d2)  # d2 -= 16 * step * q2
         self.interpolator2(d2, q1, phases)
         d1 -= q1
         self.kin1.apply(d1, q1, phases)
         q1 -= r1
-        d1 -= 4 * step * q1
-        self.interpolator1(-d1, d0, phases)
+        axpy(-4 * step, q1, d1)  # d1 -= 4 * step * q1
+        # Interpolating d1 instead of -d1 saves negating d0 at the end:
+        self.interpolator1(d1, d0, phases)
         self.kin0.apply(d0, q0, phases)
-        q0 -= residuals
+        q0 += residuals
         axpy(-step, q0, d0)  # d0 -= step * q0
-        d0 *= -1.0
         return d0
 
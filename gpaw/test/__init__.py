@@ -60,6 +60,7 @@ tests = [
     'eigh.py',
     'xc.py',
     'gradient.py',
+    'trilinear.py',
     'pbe_pw91.py',
     'cg2.py',
     'd2Excdn2.py',
@@ -298,14 +299,16 @@ for test in exclude:
 
 class TestRunner:
     def __init__(self, tests, stream=sys.__stdout__, jobs=1,
-                 show_output=False):
+                 show_output=False, failed_file=None):
         if mpi.size > 1:
             assert jobs == 1
         self.jobs = jobs
         self.show_output = show_output
         self.tests = tests
         self.failed = []
+        self.failed_file = failed_file  # names of failed tests go here
         self.garbage = []
+        self.times = {}  # wall time of each finished test in seconds
         if mpi.rank == 0:
             self.log = stream
         else:
@@ -338,8 +341,10 @@ class TestRunner:
     def run_single(self):
         while self.tests:
             test = self.tests.pop(0)
+            t0 = time.time()
             try:
                 self.run_one(test)
+                self.times[test] = time.time() - t0
             except KeyboardInterrupt:
                 self.tests.append(test)
                 break
@@ -347,6 +352,7 @@ class TestRunner:
     def run_forked(self):
         j = 0
         pids = {}
+        t0_pid = {}
         while self.tests or j > 0:
             if self.tests and j < self.jobs:
                 test = self.tests.pop(0)
@@ -357,6 +363,7 @@ class TestRunner:
                 else:
                     j += 1
                     pids[pid] = test
+                    t0_pid[pid] = time.time()
             else:
                 try:
                     while True:
@@ -370,7 +377,8 @@ class TestRunner:
                         self.tests.append(test)
                     break
                 if exitcode:
-                    self.failed.append(pids[pid])
+                    self.add_failure(pids[pid])
+                self.times[pids[pid]] = time.time() - t0_pid.pop(pid)
                 del pids[pid]
                 j -= 1
 
@@ -451,7 +459,17 @@ class TestRunner:
                         text += '%s%s' % (tb, '#' * 77)
                 self.write_result(test, text, t0)
 
+        if self.jobs == 1:
+            self.add_failure(test)
+        else:
+            # The parent process records the failure from the exit code
+            self.failed.append(test)
+
+    def add_failure(self, test):
         self.failed.append(test)
+        if self.failed_file is not None:
+            self.failed_file.write(test + '\n')
+            self.failed_file.flush()
 
     def write_result(self, test, text, t0):
         t = time.time() - t0
@@ -36,6 +36,9 @@ def test_coulomb(N=2**6, a=20):
             t0 = time.time()
             test[method] = (-0.5 * C.coulomb(nH, method=method),
                             time.time() - t0)
+        C = Coulomb(gd, precision='single')
+        t0 = time.time()
+        test['single'] = (-0.5 * C.coulomb(nH), time.time() - t0)
         return test
 
 analytic = -5 / 16.0
@@ -51,6 +54,7 @@ if not parallel:
     equal(res['recip_gauss'][0],  analytic, 6e-3)
     equal(res['recip_ewald'][0],  analytic, 2e-2)
     equal(res['dual density'][0], res['recip_gauss'][0], 1e-9)
+    equal(res['single'][0],       res['recip_gauss'][0], 1e-5)
 
 
 # mpirun -np 2 python coulomb.py --gpaw-parallel --gpaw-debug
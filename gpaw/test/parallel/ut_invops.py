@@ -335,6 +335,17 @@ class UTGaussianWavefunctionSetup(UTDomainParallelSetup):
 
         self.check_and_plot(P_ani, P0_ani, 8, 'projection,linearity')
 
+    def test_single_precision_overlaps(self):
+        spos_ac = self.atoms.get_scaled_positions() % 1.0
+        B_aa = GridPairOverlap(self.gd, self.setups).calculate_overlaps( \
+            spos_ac, self.pt)
+        gpo = GridPairOverlap(self.gd, self.setups, overlap_dtype=np.float32)
+        B32_aa = gpo.calculate_overlaps(spos_ac, self.pt)
+
+        # Single precision overlaps should agree to about 1e-6 relative
+        relerr = np.abs(B32_aa - B_aa).max() / np.abs(B_aa).max()
+        self.assertTrue(relerr < 1e-6)
+
     def test_extrapolate_overlap(self):
         kpt = self.wfs.kpt_u[0]
         ppo = ProjectorPairOverlap(self.wfs, self.atoms)
@@ -3,12 +3,10 @@ import os
 import gc
 import sys
 import time
+import shutil
 import tempfile
 from optparse import OptionParser
 
-import gpaw.mpi as mpi
-from gpaw.hooks import hooks
-
 
 parser = OptionParser(usage='%prog [options] [tests]',
                       version='%prog 0.1')
@@ -37,9 +35,31 @@ parser.add_option('-k', '--keep-temp-dir', action='store_true',
 parser.add_option('-d', '--directory', help='Run test in this directory')
 parser.add_option('-s', '--show-output', action='store_true',
                   help='Show standard output from tests.')
+parser.add_option('--times-file', metavar='FILE', default='test-times.txt',
+                  help=('Read and update wall times of the tests in FILE '
+                        '(default: test-times.txt).  With several jobs the '
+                        'longest tests are started first.'))
 
 opt, tests = parser.parse_args()
 
+# Import GPAW only now so that --help and bad arguments are fast:
+import gpaw.mpi as mpi
+from gpaw.hooks import hooks
+
+if opt.jobs > 1:
+    # Running more test processes than there are cores only makes them
+    # compete for the CPUs (and busy-poll if they use MPI)
+    try:
+        from multiprocessing import cpu_count
+        ncores = cpu_count()
+    except (ImportError, NotImplementedError):
+        ncores = opt.jobs
+    if opt.jobs > ncores:
+        if mpi.rank == 0:
+            print 'Reducing number of jobs from %d to %d (number of cores)' % (
+                opt.jobs, ncores)
+        opt.jobs = ncores
+
 
 if len(tests) == 0:
     from gpaw.test import tests
@@ -54,23 +74,40 @@ exclude = []
 if opt.exclude is not None:
     exclude += opt.exclude.split(',')
 
+index = dict([(test, i) for i, test in enumerate(tests)])
+start_index = 0
+stop_index = len(tests)
+
 if opt.from_test:
-    fromindex = tests.index(opt.from_test)
-    tests = tests[fromindex:]
+    start_index = max(start_index, index[opt.from_test])
 
 if opt.after_test:
-    index = tests.index(opt.after_test) + 1
-    tests = tests[index:]
+    start_index = max(start_index, index[opt.after_test] + 1)
 
 if opt.range:
     indices = opt.range.split(',')
-    start_index = tests.index(indices[0])
-    stop_index = tests.index(indices[1])
-    tests = tests[start_index:stop_index]
-
-for test in exclude:
-    if test in tests:
-        tests.remove(test)
+    start_index = max(start_index, index[indices[0]])
+    stop_index = index[indices[1]]
+
+exclude = set(exclude)
+tests = [test for test in tests[start_index:stop_index]
+         if test not in exclude]
+
+# Wall times of the tests from earlier runs (one "name seconds" per line):
+times = {}
+if os.path.isfile(opt.times_file):
+    for line in open(opt.times_file):
+        words = line.split()
+        if len(words) == 2:
+            times[words[0]] = float(words[1])
+
+if opt.jobs > 1 and times and not opt.reverse:
+    # Start the longest tests first so that no job is left running a
+    # long test at the end while the others are idle.  Tests without a
+    # recorded time are assumed to take the median time:
+    t_i = sorted(times.values())
+    tmedian = t_i[len(t_i) // 2]
+    tests = sorted(tests, key=lambda test: -times.get(test, tmedian))
 
 from gpaw.test import TestRunner
 
@@ -87,17 +124,30 @@ if mpi.rank == 0:
             os.mkdir(tmpdir)
 else:
     tmpdir = None
-tmpdir = mpi.broadcast_string(tmpdir)
+if mpi.size > 1:
+    tmpdir = mpi.broadcast_string(tmpdir)
 cwd = os.getcwd()
+if mpi.rank == 0:
+    # Failed tests are written as they happen so that the list survives
+    # a run that is killed or crashes:
+    failed_file = open('failed-tests.txt', 'w')
+else:
+    failed_file = None
 os.chdir(tmpdir)
 if mpi.rank == 0:
     print 'Running tests in', tmpdir
-failed = TestRunner(tests, jobs=opt.jobs, show_output=opt.show_output).run()
+runner = TestRunner(tests, jobs=opt.jobs, show_output=opt.show_output,
+                    failed_file=failed_file)
+failed = runner.run()
 os.chdir(cwd)
 if mpi.rank == 0:
-    if len(failed) > 0:
-        open('failed-tests.txt', 'w').write('\n'.join(failed) + '\n')
-    elif not opt.keep_tmpdir:
-        os.system('rm -rf ' + tmpdir)
+    failed_file.close()
+    times.update(runner.times)
+    f = open(opt.times_file, 'w')
+    for test in sorted(times):
+        print >> f, test, '%.3f' % times[test]
+    f.close()
+    if len(failed) == 0 and not opt.keep_tmpdir:
+        shutil.rmtree(tmpdir, ignore_errors=True)
 hooks.update(old_hooks.items())
 
@@ -0,0 +1,48 @@
+import numpy as np
+from gpaw.grid_descriptor import GridDescriptor
+from gpaw.test import equal
+
+
+def trilinear_numpy(gd, spos_nc, a_g):
+    """Reference implementation with numpy indexing."""
+    g_nc = gd.N_c * spos_nc - gd.beg_c
+    bg_nc = np.floor(g_nc).astype(int)
+    Bg_nc = np.ceil(g_nc).astype(int)
+    dg_nc = g_nc - bg_nc
+    Bg_nc %= gd.N_c
+    i_snc = (bg_nc, Bg_nc)
+    w_snc = (1.0 - dg_nc, 0.0 + dg_nc)
+    b_n = np.zeros(len(spos_nc))
+    for s2 in range(2):
+        for s1 in range(2):
+            for s0 in range(2):
+                b_n += (a_g[i_snc[s0][:, 0], i_snc[s1][:, 1],
+                            i_snc[s2][:, 2]] *
+                        w_snc[s0][:, 0] * w_snc[s1][:, 1] * w_snc[s2][:, 2])
+    return b_n
+
+
+np.random.seed(17)
+for pbc in [True, False]:
+    gd = GridDescriptor((8, 10, 12), (4, 5, 6), pbc)
+    a_g = gd.empty()
+    a_g[:] = np.random.random(a_g.shape)
+    if pbc:
+        spos_nc = np.random.random((50, 3))
+    else:
+        # Stay inside the grid points of the non-periodic grid:
+        spos_nc = (1.0 + np.random.random((50, 3)) * (gd.N_c - 2)) / gd.N_c
+    spos_nc[0] = gd.beg_c / gd.N_c.astype(float)  # exactly on a grid point
+    b_n = np.empty(len(spos_nc))
+    gd.interpolate_grid_points(spos_nc, a_g, b_n, use_mlsqr=False)
+    equal(abs(b_n - trilinear_numpy(gd, spos_nc, a_g)).max(), 0, 1e-12)
+
+    if not pbc:
+        # Points outside the grid must be rejected:
+        try:
+            gd.interpolate_grid_points(np.array([[0.99, 0.5, 0.5]]), a_g,
+                                       np.empty(1), use_mlsqr=False)
+        except IndexError:
+            pass
+        else:
+            raise AssertionError('point outside the grid not detected')
@@ -305,6 +305,30 @@ def mlsqr(order, cutoff, coords_nc, N_c, beg_c, data_g, target_n):
     assert is_contiguous(target_n, float)
 
     return _gpaw.mlsqr(order, cutoff, coords_nc, N_c, beg_c, data_g, target_n)
+
+
+def trilinear(coords_nc, N_c, beg_c, data_g, target_n):
+    """Interpolate points using trilinear interpolation.
+
+    Python wrapper for a c-function. See c/mlsqr.c.
+
+    coords_nc:   List of scaled coordinates
+    N_c:         Total number of grid points
+    beg_c:       The start of grid points
+    data_g:      3D-data to be interpolated
+    target_n:    Output array
+    """
+
+    assert is_contiguous(coords_nc, float)
+    assert is_contiguous(data_g, float)
+    assert coords_nc.ndim == 2 and coords_nc.shape[1] == 3
+    assert data_g.ndim == 3
+    N_c = np.ascontiguousarray(N_c, float)
+    beg_c = np.ascontiguousarray(beg_c, float)
+    assert is_contiguous(target_n, float)
+    assert target_n.shape == (len(coords_nc),)
+
+    return _gpaw.trilinear(coords_nc, N_c, beg_c, data_g, target_n)
     
 
 def interpolate_mlsqr(dg_c, vt_g, order):
@@ -139,6 +139,28 @@ def axpy(alpha, x, y):
     _gpaw.axpy(alpha, x, y)
 
 
+def multi_axpy(alpha_x, x_xG, y_xG):
+    """alpha x plus y for a stack of vectors.
+
+    Performs the operation::
+
+      y_xG[i] <- alpha_x[i] * x_xG[i] + y_xG[i]
+
+    with one call to ``C`` instead of one per vector.
+    """
+    assert alpha_x.dtype in [float, complex]
+    assert is_contiguous(alpha_x)
+    if alpha_x.dtype == complex:
+        assert is_contiguous(x_xG, complex) and is_contiguous(y_xG, complex)
+    else:
+        assert x_xG.dtype in [float, complex]
+        assert x_xG.dtype == y_xG.dtype
+        assert x_xG.flags.contiguous and y_xG.flags.contiguous
+    assert x_xG.shape == y_xG.shape
+    assert alpha_x.shape == x_xG.shape[:1]
+    _gpaw.multi_axpy(alpha_x, x_xG, y_xG)
+
+
 def rk(alpha, a, beta, c):
     """Rank-k update of a matrix.
 
@@ -334,6 +356,7 @@ if not debug:
     gemm = _gpaw.gemm
     gemv = _gpaw.gemv
     axpy = _gpaw.axpy
+    multi_axpy = _gpaw.multi_axpy
     rk = _gpaw.rk
     r2k = _gpaw.r2k
     dotc = _gpaw.dotc
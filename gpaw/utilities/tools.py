@@ -243,9 +243,8 @@ def apply_subspace_mask(H_nn, f_n):
     This method forces the H_nn matrix into a block-diagonal form
     in the occupied and unoccupied states respectively.
     """
-    occ = 0
-    nbands = len(f_n)
-    while occ < nbands and f_n[occ] > 1e-3: occ += 1
+    # Number of leading occupied states:
+    occ = np.cumprod(np.asarray(f_n) > 1e-3).sum()
     H_nn[occ:, :occ] = H_nn[:occ, occ:] = 0
 
 
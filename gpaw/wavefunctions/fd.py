@@ -48,8 +48,9 @@ class FDWaveFunctions(FDPWWaveFunctions):
         return Preconditioner(self.gd, self.kin, self.dtype, block)
     
     def apply_pseudo_hamiltonian(self, kpt, hamiltonian, psit_xG, Htpsit_xG):
-        self.kin.apply(psit_xG, Htpsit_xG, kpt.phase_cd)
-        hamiltonian.apply_local_potential(psit_xG, Htpsit_xG, kpt.s)
+        # Kinetic energy and local potential in one sweep:
+        self.kin.apply(psit_xG, Htpsit_xG, kpt.phase_cd,
+                       hamiltonian.vt_sG[kpt.s])
 
     def add_orbital_density(self, nt_G, kpt, n):
         if self.dtype == float:
@@ -77,6 +77,7 @@ class HybridXC(XCFunctional):
         self.exx_s = np.zeros(self.nspins)
         self.ekin_s = np.zeros(self.nspins)
         self.nocc_s = np.empty(self.nspins, int)
+        self.vt_nG_work = None  # scratch array for rotate()
         
         if self.finegrid:
             self.poissonsolver = hamiltonian.poisson
@@ -302,11 +303,26 @@ class HybridXC(XCFunctional):
 
         nocc = len(kpt.vt_nG)
         U_nn = U_nn[:nocc, :nocc]
-        gemm(1.0, kpt.vt_nG.copy(), U_nn, 0.0, kpt.vt_nG)
-        for v_ni in kpt.vxx_ani.values():
-            gemm(1.0, v_ni.copy(), U_nn, 0.0, v_ni)
-        for v_nii in kpt.vxx_anii.values():
-            gemm(1.0, v_nii.copy(), U_nn, 0.0, v_nii)
+        # Rotate into a scratch array and swap it with kpt.vt_nG:
+        vt_nG = self.vt_nG_work
+        if vt_nG is None or vt_nG.shape != kpt.vt_nG.shape:
+            vt_nG = self.gd.empty(nocc)
+        gemm(1.0, kpt.vt_nG, U_nn, 0.0, vt_nG)
+        self.vt_nG_work = kpt.vt_nG
+        kpt.vt_nG = vt_nG
+
+        # Rotate the atomic terms of all atoms with one gemm:
+        v_x = kpt.vxx_ani.values() + kpt.vxx_anii.values()
+        if nocc == 0 or not v_x:
+            return
+        v_nI = np.concatenate([v.reshape(nocc, -1) for v in v_x], axis=1)
+        newv_nI = np.empty_like(v_nI)
+        gemm(1.0, v_nI, U_nn, 0.0, newv_nI)
+        I1 = 0
+        for v in v_x:
+            I2 = I1 + v[0].size
+            v[:] = newv_nI[:, I1:I2].reshape(v.shape)
+            I1 = I2
 
         
 def atomic_exact_exchange(atom, type = 'all'):